@@ -1,7 +1,9 @@
 import collections
+import concurrent.futures
 import gc
 import os
 import random
+import re
 import threading
 import time
 
@@ -55,23 +57,54 @@ regen_file_enum_to_str_lookup[ REGENERATE_FILE_DATA_JOB_CHECK_SIMILAR_FILES_MEMB
 regen_file_enum_to_str_lookup[ REGENERATE_FILE_DATA_JOB_SIMILAR_FILES_METADATA ] = 'regenerate similar files metadata'
 regen_file_enum_to_str_lookup[ REGENERATE_FILE_DATA_JOB_FILE_MODIFIED_TIMESTAMP ] = 'regenerate file modified date'
 
-regen_file_enum_to_description_lookup = {}
+# the job enums are dense and start at zero, so a tuple turns every lookup into an index instead of a hash
+regen_file_enum_to_str_lookup = tuple( regen_file_enum_to_str_lookup[ i ] for i in range( len( regen_file_enum_to_str_lookup ) ) )
 
-regen_file_enum_to_description_lookup[ REGENERATE_FILE_DATA_JOB_FILE_METADATA ] = 'This regenerates file metadata like resolution and duration, or even filetype (such as mkv->webm), which may have been misparsed in a previous version.'
-regen_file_enum_to_description_lookup[ REGENERATE_FILE_DATA_JOB_FORCE_THUMBNAIL ] = 'This forces a complete regeneration of the thumbnail from the source file.'
-regen_file_enum_to_description_lookup[ REGENERATE_FILE_DATA_JOB_REFIT_THUMBNAIL ] = 'This looks for the existing thumbnail, and if it is not the correct resolution or is missing, will regenerate a new one for the source file.'
-regen_file_enum_to_description_lookup[ REGENERATE_FILE_DATA_JOB_OTHER_HASHES ] = 'This regenerates hydrus\'s store of md5, sha1, and sha512 supplementary hashes, which it can use for various external (usually website) lookups.'
-regen_file_enum_to_description_lookup[ REGENERATE_FILE_DATA_JOB_DELETE_NEIGHBOUR_DUPES ] = 'Sometimes, a file metadata regeneration will mean a new filetype and thus a new file extension. If the existing, incorrectly named file is in use, it must be copied rather than renamed, and so there is a spare duplicate left over after the operation. This jobs cleans up the duplicate at a later time.'
-regen_file_enum_to_description_lookup[ REGENERATE_FILE_DATA_JOB_FILE_INTEGRITY_PRESENCE ] = 'This checks to see if the file is present in the file system as expected. If it is not, the internal file record in the database is removed, just as if the file were deleted. Use this if you have manually deleted or otherwise lost a number of files from your file structure and need hydrus to re-sync with what it actually has. Missing files will have their known URLs exported to your database directory.'
-regen_file_enum_to_description_lookup[ REGENERATE_FILE_DATA_JOB_FILE_INTEGRITY_PRESENCE_URL ] = 'This checks to see if the file is present in the file system as expected. If it is not, and it has known post/file urls, the URLs will be automatically added to a new URL downloader. Missing files will also have their known URLs exported to your database directory.'
-regen_file_enum_to_description_lookup[ REGENERATE_FILE_DATA_JOB_FILE_INTEGRITY_DATA ] = 'This does the same check as the \'file is missing\' job, and if the file is where it is expected, it ensures its file content, byte-for-byte, is correct. This is a heavy job, so be wary. If the file is incorrect, it will be exported to your database directory along with their known URLs, and the file record deleted.'
-regen_file_enum_to_description_lookup[ REGENERATE_FILE_DATA_JOB_FILE_INTEGRITY_DATA_URL ] = 'This does the same check as the \'file is missing\' job, and if the file is where it is expected, it ensures its file content, byte-for-byte, is correct. This is a heavy job, so be wary. If the file is incorrect _and_ is has known post/file urls, the URLs will be automatically added to a new URL downloader. Incorrect files will also have their known URLs exported to your database directory.'
-regen_file_enum_to_description_lookup[ REGENERATE_FILE_DATA_JOB_FILE_INTEGRITY_DATA_SILENT_DELETE ] = 'If the file is where it is expected, this ensures its file content, byte-for-byte, is correct. This is a heavy job, so be wary. If the file is incorrect, it will be exported to your database directory along with its known URLs. The client\'s file record will not be deleted. This is useful if you have a valid backup and need to clear out invalid files from your live db so you can fill in gaps from your backup with a program like FreeFileSync.'
-regen_file_enum_to_description_lookup[ REGENERATE_FILE_DATA_JOB_FIX_PERMISSIONS ] = 'This ensures that files in the file system are readable and writeable. For Linux/macOS users, it specifically sets 644. If you wish to run this job on Linux/macOS, ensure you are first the file owner of all your files.'
-regen_file_enum_to_description_lookup[ REGENERATE_FILE_DATA_JOB_CHECK_SIMILAR_FILES_MEMBERSHIP ] = 'This checks to see if files should be in the similar files system, and if they are falsely in or falsely out, it will remove their record or queue them up for a search as appropriate. It is useful to repair database damage.'
-regen_file_enum_to_description_lookup[ REGENERATE_FILE_DATA_JOB_SIMILAR_FILES_METADATA ] = 'This forces a regeneration of the file\'s similar-files \'phashes\'. It is not useful unless you know there is missing data to repair.'
-regen_file_enum_to_description_lookup[ REGENERATE_FILE_DATA_JOB_FILE_MODIFIED_TIMESTAMP ] = 'This rechecks the file\'s modified timestamp and saves it to the database.'
+_regen_file_enum_to_description_lookup = None
 
+def GetRegenFileEnumDescription( job_type ):
+    
+    # this verbose help text only ever appears in the review dialogs, so no need to keep it all live in memory from boot
+    
+    global _regen_file_enum_to_description_lookup
+    
+    if _regen_file_enum_to_description_lookup is None:
+        
+        description_lookup = {}
+        
+        description_lookup[ REGENERATE_FILE_DATA_JOB_FILE_METADATA ] = 'This regenerates file metadata like resolution and duration, or even filetype (such as mkv->webm), which may have been misparsed in a previous version.'
+        
+        description_lookup[ REGENERATE_FILE_DATA_JOB_FORCE_THUMBNAIL ] = 'This forces a complete regeneration of the thumbnail from the source file.'
+        
+        description_lookup[ REGENERATE_FILE_DATA_JOB_REFIT_THUMBNAIL ] = 'This looks for the existing thumbnail, and if it is not the correct resolution or is missing, will regenerate a new one for the source file.'
+        
+        description_lookup[ REGENERATE_FILE_DATA_JOB_OTHER_HASHES ] = 'This regenerates hydrus\'s store of md5, sha1, and sha512 supplementary hashes, which it can use for various external (usually website) lookups.'
+        
+        description_lookup[ REGENERATE_FILE_DATA_JOB_DELETE_NEIGHBOUR_DUPES ] = 'Sometimes, a file metadata regeneration will mean a new filetype and thus a new file extension. If the existing, incorrectly named file is in use, it must be copied rather than renamed, and so there is a spare duplicate left over after the operation. This jobs cleans up the duplicate at a later time.'
+        
+        description_lookup[ REGENERATE_FILE_DATA_JOB_FILE_INTEGRITY_PRESENCE ] = 'This checks to see if the file is present in the file system as expected. If it is not, the internal file record in the database is removed, just as if the file were deleted. Use this if you have manually deleted or otherwise lost a number of files from your file structure and need hydrus to re-sync with what it actually has. Missing files will have their known URLs exported to your database directory.'
+        
+        description_lookup[ REGENERATE_FILE_DATA_JOB_FILE_INTEGRITY_PRESENCE_URL ] = 'This checks to see if the file is present in the file system as expected. If it is not, and it has known post/file urls, the URLs will be automatically added to a new URL downloader. Missing files will also have their known URLs exported to your database directory.'
+        
+        description_lookup[ REGENERATE_FILE_DATA_JOB_FILE_INTEGRITY_DATA ] = 'This does the same check as the \'file is missing\' job, and if the file is where it is expected, it ensures its file content, byte-for-byte, is correct. This is a heavy job, so be wary. If the file is incorrect, it will be exported to your database directory along with their known URLs, and the file record deleted.'
+        
+        description_lookup[ REGENERATE_FILE_DATA_JOB_FILE_INTEGRITY_DATA_URL ] = 'This does the same check as the \'file is missing\' job, and if the file is where it is expected, it ensures its file content, byte-for-byte, is correct. This is a heavy job, so be wary. If the file is incorrect _and_ is has known post/file urls, the URLs will be automatically added to a new URL downloader. Incorrect files will also have their known URLs exported to your database directory.'
+        
+        description_lookup[ REGENERATE_FILE_DATA_JOB_FILE_INTEGRITY_DATA_SILENT_DELETE ] = 'If the file is where it is expected, this ensures its file content, byte-for-byte, is correct. This is a heavy job, so be wary. If the file is incorrect, it will be exported to your database directory along with its known URLs. The client\'s file record will not be deleted. This is useful if you have a valid backup and need to clear out invalid files from your live db so you can fill in gaps from your backup with a program like FreeFileSync.'
+        
+        description_lookup[ REGENERATE_FILE_DATA_JOB_FIX_PERMISSIONS ] = 'This ensures that files in the file system are readable and writeable. For Linux/macOS users, it specifically sets 644. If you wish to run this job on Linux/macOS, ensure you are first the file owner of all your files.'
+        
+        description_lookup[ REGENERATE_FILE_DATA_JOB_CHECK_SIMILAR_FILES_MEMBERSHIP ] = 'This checks to see if files should be in the similar files system, and if they are falsely in or falsely out, it will remove their record or queue them up for a search as appropriate. It is useful to repair database damage.'
+        
+        description_lookup[ REGENERATE_FILE_DATA_JOB_SIMILAR_FILES_METADATA ] = 'This forces a regeneration of the file\'s similar-files \'phashes\'. It is not useful unless you know there is missing data to repair.'
+        
+        description_lookup[ REGENERATE_FILE_DATA_JOB_FILE_MODIFIED_TIMESTAMP ] = 'This rechecks the file\'s modified timestamp and saves it to the database.'
+        
+        _regen_file_enum_to_description_lookup = tuple( description_lookup[ i ] for i in range( len( description_lookup ) ) )
+        
+    
+    return _regen_file_enum_to_description_lookup[ job_type ]
+    
 NORMALISED_BIG_JOB_WEIGHT = 100
 
 regen_file_enum_to_job_weight_lookup = {}
@@ -91,6 +124,9 @@ regen_file_enum_to_job_weight_lookup[ REGENERATE_FILE_DATA_JOB_CHECK_SIMILAR_FIL
 regen_file_enum_to_job_weight_lookup[ REGENERATE_FILE_DATA_JOB_SIMILAR_FILES_METADATA ] = 100
 regen_file_enum_to_job_weight_lookup[ REGENERATE_FILE_DATA_JOB_FILE_MODIFIED_TIMESTAMP ] = 10
 
+# the job enums are dense and start at zero, so a tuple turns every lookup into an index instead of a hash
+regen_file_enum_to_job_weight_lookup = tuple( regen_file_enum_to_job_weight_lookup[ i ] for i in range( len( regen_file_enum_to_job_weight_lookup ) ) )
+
 regen_file_enum_to_overruled_jobs = {}
 
 regen_file_enum_to_overruled_jobs[ REGENERATE_FILE_DATA_JOB_FILE_METADATA ] = []
@@ -108,38 +144,153 @@ regen_file_enum_to_overruled_jobs[ REGENERATE_FILE_DATA_JOB_CHECK_SIMILAR_FILES_
 regen_file_enum_to_overruled_jobs[ REGENERATE_FILE_DATA_JOB_SIMILAR_FILES_METADATA ] = [ REGENERATE_FILE_DATA_JOB_CHECK_SIMILAR_FILES_MEMBERSHIP ]
 regen_file_enum_to_overruled_jobs[ REGENERATE_FILE_DATA_JOB_FILE_MODIFIED_TIMESTAMP ] = []
 
+# when a big import queues tens of thousands of jobs, 'does A overrule B' checks add up, so freeze these for O(1) membership
+regen_file_enum_to_overruled_jobs = { job_type : frozenset( overruled_jobs ) for ( job_type, overruled_jobs ) in regen_file_enum_to_overruled_jobs.items() }
+
 ALL_REGEN_JOBS_IN_PREFERRED_ORDER = [ REGENERATE_FILE_DATA_JOB_FILE_INTEGRITY_PRESENCE_URL, REGENERATE_FILE_DATA_JOB_FILE_INTEGRITY_DATA_URL, REGENERATE_FILE_DATA_JOB_FILE_INTEGRITY_PRESENCE, REGENERATE_FILE_DATA_JOB_FILE_INTEGRITY_DATA, REGENERATE_FILE_DATA_JOB_FILE_INTEGRITY_DATA_SILENT_DELETE, REGENERATE_FILE_DATA_JOB_FILE_METADATA, REGENERATE_FILE_DATA_JOB_REFIT_THUMBNAIL, REGENERATE_FILE_DATA_JOB_FORCE_THUMBNAIL, REGENERATE_FILE_DATA_JOB_SIMILAR_FILES_METADATA, REGENERATE_FILE_DATA_JOB_CHECK_SIMILAR_FILES_MEMBERSHIP, REGENERATE_FILE_DATA_JOB_FIX_PERMISSIONS, REGENERATE_FILE_DATA_JOB_FILE_MODIFIED_TIMESTAMP, REGENERATE_FILE_DATA_JOB_OTHER_HASHES, REGENERATE_FILE_DATA_JOB_DELETE_NEIGHBOUR_DUPES ]
 
-def GetAllFilePaths( raw_paths, do_human_sort = True ):
+ALL_REGEN_JOBS_SET = frozenset( ALL_REGEN_JOBS_IN_PREFERRED_ORDER )
+
+# membership tests on these groups sit on the maintenance hot path, so they get frozensets rather than linear tuple scans
+
+FILE_INTEGRITY_JOBS = frozenset( ( REGENERATE_FILE_DATA_JOB_FILE_INTEGRITY_PRESENCE, REGENERATE_FILE_DATA_JOB_FILE_INTEGRITY_PRESENCE_URL, REGENERATE_FILE_DATA_JOB_FILE_INTEGRITY_DATA, REGENERATE_FILE_DATA_JOB_FILE_INTEGRITY_DATA_URL, REGENERATE_FILE_DATA_JOB_FILE_INTEGRITY_DATA_SILENT_DELETE ) )
+FILE_INTEGRITY_DATA_JOBS = frozenset( ( REGENERATE_FILE_DATA_JOB_FILE_INTEGRITY_DATA, REGENERATE_FILE_DATA_JOB_FILE_INTEGRITY_DATA_URL, REGENERATE_FILE_DATA_JOB_FILE_INTEGRITY_DATA_SILENT_DELETE ) )
+FILE_INTEGRITY_DELETE_RECORD_JOBS = frozenset( ( REGENERATE_FILE_DATA_JOB_FILE_INTEGRITY_PRESENCE, REGENERATE_FILE_DATA_JOB_FILE_INTEGRITY_DATA ) )
+FILE_INTEGRITY_TRY_REDOWNLOAD_JOBS = frozenset( ( REGENERATE_FILE_DATA_JOB_FILE_INTEGRITY_PRESENCE_URL, REGENERATE_FILE_DATA_JOB_FILE_INTEGRITY_DATA_URL ) )
+FILE_INTEGRITY_EXPORT_JOBS = frozenset( ( REGENERATE_FILE_DATA_JOB_FILE_INTEGRITY_DATA, REGENERATE_FILE_DATA_JOB_FILE_INTEGRITY_DATA_SILENT_DELETE ) )
+
+# these are independent per-file decode/hash jobs whose heavy lifting releases the GIL, so a batch of them can fan out across a worker pool
+PARALLELISABLE_REGEN_JOBS = frozenset( ( REGENERATE_FILE_DATA_JOB_FILE_METADATA, REGENERATE_FILE_DATA_JOB_OTHER_HASHES, REGENERATE_FILE_DATA_JOB_SIMILAR_FILES_METADATA ) )
+
+# one C-level scan per path, and IGNORECASE catches the .TXT/.JSON files windows users drop on us
+SIDECAR_EXT_PATTERN = re.compile( r'\.(?:txt|json|xml)$', re.IGNORECASE )
+
+# hash[0] -> 'fxx'/'txx', so hot paths do not have to hex-encode a whole 32-byte hash just to use two characters of it
+prefix_f_lookup = tuple( 'f{:02x}'.format( i ) for i in range( 256 ) )
+prefix_t_lookup = tuple( 't{:02x}'.format( i ) for i in range( 256 ) )
+
+# the mimes are small ints, so indexing a tuple gets us the ext without a dict probe in the per-file loops
+# the holes get None so a rogue mime still fails loudly, rather than quietly writing an extensionless path
+mime_ext_lookup = tuple( HC.mime_ext_lookup.get( mime ) for mime in range( max( HC.mime_ext_lookup ) + 1 ) )
+
+def GetAllFilePaths( raw_paths, do_human_sort = True, clear_out_sidecars = False ):
     
     file_paths = []
     
-    paths_to_process = list( raw_paths )
+    def process_path( seq, path ):
+        
+        subdir_paths = []
+        found_file_paths = []
+        
+        try:
+            
+            # the dir entries already know whether they are directories, so this does not need an isdir stat call per path
+            
+            with os.scandir( path ) as dir_entries:
+                
+                for dir_entry in dir_entries:
+                    
+                    if dir_entry.is_dir( follow_symlinks = False ):
+                        
+                        subdir_paths.append( dir_entry.path )
+                        
+                    else:
+                        
+                        found_file_paths.append( dir_entry.path )
+                        
+                    
+                
+            
+        except ( NotADirectoryError, FileNotFoundError ):
+            
+            # it is a file, or it does not exist--either way, we'll let the importer sort it out
+            
+            found_file_paths.append( path )
+            
+        
+        return ( seq, subdir_paths, found_file_paths )
+        
+    
+    # directory listing is io-bound and embarrassingly parallel, so a pool of workers hides the per-directory latency of network shares and other slow drives
     
-    while len( paths_to_process ) > 0:
+    with concurrent.futures.ThreadPoolExecutor( max_workers = 16 ) as executor:
+        
+        # an explicit deque holds the backlog, rather than a future per discovered directory--on a tree with millions of entries, that's a lot of dead future objects we don't make
         
-        next_paths_to_process = []
+        paths_to_process = collections.deque( raw_paths )
         
-        for path in paths_to_process:
+        pending_futures = set()
+        
+        # the workers complete in whatever order the disk pleases, but callers that skip the human sort rely on getting paths back in the order they gave them, so every job carries a sequence number and results are merged back in submission order
+        
+        next_seq_to_submit = 0
+        next_seq_to_merge = 0
+        seqs_to_results = {}
+        
+        while len( paths_to_process ) > 0 or len( pending_futures ) > 0:
             
             if HG.view_shutdown:
                 
+                for pending_future in pending_futures:
+                    
+                    pending_future.cancel()
+                    
+                
                 raise HydrusExceptions.ShutdownException()
                 
             
-            if os.path.isdir( path ):
+            while len( paths_to_process ) > 0 and len( pending_futures ) < 64:
                 
-                subpaths = [ os.path.join( path, filename ) for filename in os.listdir( path ) ]
+                pending_futures.add( executor.submit( process_path, next_seq_to_submit, paths_to_process.popleft() ) )
                 
-                next_paths_to_process.extend( subpaths )
+                next_seq_to_submit += 1
                 
-            else:
+            
+            ( done_futures, pending_futures ) = concurrent.futures.wait( pending_futures, timeout = 1.0, return_when = concurrent.futures.FIRST_COMPLETED )
+            
+            for done_future in done_futures:
+                
+                ( seq, subdir_paths, found_file_paths ) = done_future.result()
+                
+                seqs_to_results[ seq ] = ( subdir_paths, found_file_paths )
+                
+            
+            while next_seq_to_merge in seqs_to_results:
                 
-                file_paths.append( path )
+                ( subdir_paths, found_file_paths ) = seqs_to_results.pop( next_seq_to_merge )
+                
+                next_seq_to_merge += 1
+                
+                file_paths.extend( found_file_paths )
+                
+                paths_to_process.extend( subdir_paths )
                 
             
         
-        paths_to_process = next_paths_to_process
+    
+    if clear_out_sidecars:
+        
+        # a sidecar is a .txt/.json/.xml file sitting next to a media file with the same basename prefix
+        # we decode each path just once up front, and then the filter itself is all set lookups, keeping this linear in the number of paths
+        
+        # rpartition/partition are single C-level string ops, where os.path.basename is a python call that has to re-examine the string
+        
+        if os.altsep is None:
+            
+            decode_paths = file_paths
+            
+        else:
+            
+            # normalise the separators once so the rpartition below only has to look for one of them
+            
+            decode_paths = [ file_path.replace( os.altsep, os.sep ) for file_path in file_paths ]
+            
+        
+        decoded_file_paths = [ ( file_path, decode_path.rpartition( os.sep )[2].partition( '.' )[0], SIDECAR_EXT_PATTERN.search( file_path ) is not None ) for ( file_path, decode_path ) in zip( file_paths, decode_paths ) ]
+        
+        non_sidecar_base_prefixes = { base_prefix for ( file_path, base_prefix, has_sidecar_ext ) in decoded_file_paths if not has_sidecar_ext }
+        
+        file_paths = [ file_path for ( file_path, base_prefix, has_sidecar_ext ) in decoded_file_paths if not ( has_sidecar_ext and base_prefix in non_sidecar_base_prefixes ) ]
         
     
     if do_human_sort:
@@ -157,11 +308,35 @@ class ClientFilesManager( object ):
         
         self._rwlock = ClientThreading.FileRWLock()
         
+        # per-hash work only ever touches its own file and thumbnail, so those jobs take the structural lock shared and serialise on a small per-prefix mutex instead
+        # an import or thumbnail write then no longer blocks every reader in the client, while rebalance and orphan clearance still get total exclusion through the write side
+        
+        self._prefix_shard_locks = tuple( threading.Lock() for i in range( 256 ) )
+        
         self._prefixes_to_locations = {}
         
+        self._f_prefix_locations = ()
+        self._t_prefix_locations = ()
+        
+        self._f_prefix_dirs = ()
+        self._t_prefix_dirs = ()
+        
+        self._locations_to_file_prefixes = {}
+        self._distinct_locations = frozenset()
+        
+        self._locations_to_real_paths = {}
+        self._locations_to_device_ids = {}
+        self._devices_to_free_space = {}
+        
+        self._t_prefix_listings = {}
+        
         self._bad_error_occurred = False
         self._missing_locations = set()
         
+        self._waits_on_wakeup = None
+        
+        self._controller.sub( self, 'NotifyNewOptions', 'notify_new_options' )
+        
         self._Reinit()
         
     
@@ -174,6 +349,19 @@ class ClientFilesManager( object ):
             HydrusData.ShowText( 'Adding file to client file structure: from {} to {}'.format( source_path, dest_path ) )
             
         
+        file_size = os.path.getsize( source_path )
+        
+        dest_free_space = self._GetFileStorageFreeSpace( hash )
+        
+        if dest_free_space < 100 * 1048576 + file_size:
+            
+            message = 'The disk for path "{}" is almost full and cannot take the file "{}", which is {}! Please free up some space.'.format( dest_path, hash.hex(), HydrusData.ToHumanBytes( file_size ) )
+            
+            HydrusData.ShowText( message )
+            
+            raise Exception( message )
+            
+        
         successful = HydrusPaths.MirrorFile( source_path, dest_path )
         
         if not successful:
@@ -195,20 +383,34 @@ class ClientFilesManager( object ):
             
             HydrusPaths.MakeFileWriteable( dest_path )
             
-            with open( dest_path, 'wb' ) as f:
+            # we already have the complete bytes object, so write through a raw fd and skip the BufferedWriter machinery
+            
+            flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC
+            
+            if hasattr( os, 'O_BINARY' ):
                 
-                f.write( thumbnail_bytes )
+                flags |= os.O_BINARY
                 
             
-        except Exception as e:
-            
-            hash_encoded = hash.hex()
+            fd = os.open( dest_path, flags, 0o644 )
             
-            prefix = 't' + hash_encoded[:2]
+            try:
+                
+                num_written = os.write( fd, thumbnail_bytes )
+                
+                while num_written < len( thumbnail_bytes ):
+                    
+                    num_written += os.write( fd, memoryview( thumbnail_bytes )[ num_written : ] )
+                    
+                
+            finally:
+                
+                os.close( fd )
+                
             
-            location = self._prefixes_to_locations[ prefix ]    
+        except Exception as e:
             
-            thumb_dir = os.path.join( location, prefix )
+            thumb_dir = self._t_prefix_dirs[ hash[0] ]
             
             if not os.path.exists( thumb_dir ):
                 
@@ -218,6 +420,13 @@ class ClientFilesManager( object ):
             raise HydrusExceptions.FileMissingException( 'The thumbnail for file "{}" failed to write to path "{}". This event suggests that hydrus does not have permission to write to its thumbnail folder. Please check everything is ok.'.format( hash.hex(), dest_path ) )
             
         
+        listing_entry = self._t_prefix_listings.get( hash[0] )
+        
+        if listing_entry is not None:
+            
+            listing_entry[0].add( hash.hex() + '.thumbnail' )
+            
+        
         if not silent:
             
             self._controller.pub( 'clear_thumbnails', { hash } )
@@ -247,6 +456,25 @@ class ClientFilesManager( object ):
             known_locations.add( thumbnail_override )
             
         
+        # one readdir per known location beats a stat per (missing prefix x location) pair, which hurts on slow drives
+        
+        locations_to_present_prefixes = {}
+        
+        for known_location in known_locations:
+            
+            try:
+                
+                with os.scandir( known_location ) as dir_entries:
+                    
+                    locations_to_present_prefixes[ known_location ] = { dir_entry.name for dir_entry in dir_entries if dir_entry.is_dir() }
+                    
+                
+            except OSError:
+                
+                locations_to_present_prefixes[ known_location ] = set()
+                
+            
+        
         for ( missing_location, prefix ) in self._missing_locations:
             
             potential_correct_locations = []
@@ -258,9 +486,7 @@ class ClientFilesManager( object ):
                     continue
                     
                 
-                dir_path = os.path.join( known_location, prefix )
-                
-                if os.path.exists( dir_path ) and os.path.isdir( dir_path ):
+                if prefix in locations_to_present_prefixes[ known_location ]:
                     
                     potential_correct_locations.append( known_location )
                     
@@ -326,15 +552,26 @@ class ClientFilesManager( object ):
             
             try:
                 
-                HydrusPaths.MergeFile( old_path, new_path )
+                # a same-volume ext change is just a metadata rename, so try that before the heavier merge/copy machinery
                 
-                needed_to_copy_file = False
+                os.rename( old_path, new_path )
                 
-            except:
+                needed_to_copy_file = False
                 
-                HydrusPaths.MirrorFile( old_path, new_path )
+            except OSError:
                 
-                needed_to_copy_file = True
+                try:
+                    
+                    HydrusPaths.MergeFile( old_path, new_path )
+                    
+                    needed_to_copy_file = False
+                    
+                except:
+                    
+                    HydrusPaths.MirrorFile( old_path, new_path )
+                    
+                    needed_to_copy_file = True
+                    
                 
             
         else:
@@ -351,33 +588,17 @@ class ClientFilesManager( object ):
         
         self._WaitOnWakeup()
         
-        hash_encoded = hash.hex()
-        
-        prefix = 'f' + hash_encoded[:2]
-        
-        location = self._prefixes_to_locations[ prefix ]
-        
-        path = os.path.join( location, prefix, hash_encoded + HC.mime_ext_lookup[ mime ] )
-        
-        return path
+        return self._f_prefix_dirs[ hash[0] ] + os.sep + hash.hex() + mime_ext_lookup[ mime ]
         
     
     def _GenerateExpectedThumbnailPath( self, hash ):
         
         self._WaitOnWakeup()
         
-        hash_encoded = hash.hex()
-        
-        prefix = 't' + hash_encoded[:2]
-        
-        location = self._prefixes_to_locations[ prefix ]
-        
-        path = os.path.join( location, prefix, hash_encoded ) + '.thumbnail'
-        
-        return path
+        return self._t_prefix_dirs[ hash[0] ] + os.sep + hash.hex() + '.thumbnail'
         
     
-    def _GenerateThumbnailBytes( self, file_path, media ):
+    def _GenerateThumbnailBytes( self, file_path, media, bounding_dimensions = None, percentage_in = None ):
         
         hash = media.GetHash()
         mime = media.GetMime()
@@ -385,11 +606,19 @@ class ClientFilesManager( object ):
         duration = media.GetDuration()
         num_frames = media.GetNumFrames()
         
-        bounding_dimensions = HG.client_controller.options[ 'thumbnail_dimensions' ]
+        # batch callers pass these in so a thousand thumbnails do not mean a thousand options lookups
+        
+        if bounding_dimensions is None:
+            
+            bounding_dimensions = HG.client_controller.options[ 'thumbnail_dimensions' ]
+            
         
         target_resolution = HydrusImageHandling.GetThumbnailResolution( ( width, height ), bounding_dimensions )
         
-        percentage_in = self._controller.new_options.GetInteger( 'video_thumbnail_percentage_in' )
+        if percentage_in is None:
+            
+            percentage_in = self._controller.new_options.GetInteger( 'video_thumbnail_percentage_in' )
+            
         
         try:
             
@@ -403,19 +632,140 @@ class ClientFilesManager( object ):
         return thumbnail_bytes
         
     
+    def _GetFileStorageFreeSpace( self, hash ):
+        
+        location = self._f_prefix_locations[ hash[0] ]
+        
+        # two names for the same mount (e.g. prefix folders symlinked onto an external drive) should share one cache entry, so resolve to the real path first
+        # realpath is not cheap itself, hence the memo
+        
+        real_location = self._locations_to_real_paths.get( location )
+        
+        if real_location is None:
+            
+            try:
+                
+                real_location = os.path.realpath( location )
+                
+            except OSError:
+                
+                real_location = location
+                
+            
+            self._locations_to_real_paths[ location ] = real_location
+            
+        
+        location = real_location
+        
+        # a user will often have a dozen locations sitting on the one partition, so key the cache by device--one statvfs then covers the lot
+        
+        device_id = self._locations_to_device_ids.get( location )
+        
+        if device_id is None:
+            
+            try:
+                
+                device_id = os.stat( location ).st_dev
+                
+            except OSError:
+                
+                # can't stat it for whatever reason, so the location string itself will do as a cache key
+                
+                device_id = location
+                
+            
+            self._locations_to_device_ids[ location ] = device_id
+            
+        
+        now = HydrusData.GetNow()
+        
+        # a single get and a single store on a builtin dict are atomic under the GIL, so this cache needs no lock of its own
+        # we store the absolute expiry time, so the hot path here is one probe and one comparison
+        
+        cache_entry = self._devices_to_free_space.get( device_id )
+        
+        if cache_entry is not None:
+            
+            ( free_space, expiry_time ) = cache_entry
+            
+            if now < expiry_time:
+                
+                return free_space
+                
+            
+        
+        free_space = HydrusPaths.GetFreeSpace( location )
+        
+        if free_space > 100 * ( 1024 ** 3 ):
+            
+            check_period = 3600
+            
+        elif free_space > 15 * ( 1024 ** 3 ):
+            
+            check_period = 600
+            
+        else:
+            
+            check_period = 60
+            
+        
+        self._devices_to_free_space[ device_id ] = ( free_space, now + check_period )
+        
+        return free_space
+        
+    
     def _GetRecoverTuple( self ):
         
-        all_locations = { location for location in list(self._prefixes_to_locations.values()) }
+        # two location strings can resolve to the same actual directory (symlinks, mapped drives), and we must not try to 'recover' a dir into itself
+        # one stat per location up front lets us compare cached ( st_dev, st_ino ) identities instead of calling samefile per pair
         
-        all_prefixes = list(self._prefixes_to_locations.keys())
+        locations_to_stat_ids = {}
         
-        for possible_location in all_locations:
+        for location in self._distinct_locations:
+            
+            try:
+                
+                stat_result = os.stat( location )
+                
+                locations_to_stat_ids[ location ] = ( stat_result.st_dev, stat_result.st_ino )
+                
+            except OSError:
+                
+                locations_to_stat_ids[ location ] = None
+                
+            
+        
+        # one readdir per location tells us every prefix dir it holds, instead of an exists probe per ( location, prefix ) pair
+        
+        for possible_location in self._distinct_locations:
+            
+            try:
+                
+                with os.scandir( possible_location ) as dir_entries:
+                    
+                    present_prefixes = { dir_entry.name for dir_entry in dir_entries if dir_entry.is_dir() }
+                    
+                
+            except OSError:
+                
+                continue
+                
+            
+            possible_stat_id = locations_to_stat_ids[ possible_location ]
             
-            for prefix in all_prefixes:
+            for ( prefix, correct_location ) in self._prefixes_to_locations.items():
                 
-                correct_location = self._prefixes_to_locations[ prefix ]
+                if possible_location == correct_location:
+                    
+                    continue
+                    
+                
+                if possible_stat_id is not None and possible_stat_id == locations_to_stat_ids[ correct_location ]:
+                    
+                    continue
+                    
                 
-                if possible_location != correct_location and os.path.exists( os.path.join( possible_location, prefix ) ):
+                if prefix in present_prefixes:
                     
                     recoverable_location = possible_location
                     
@@ -433,20 +783,11 @@ class ClientFilesManager( object ):
         
         total_weight = sum( locations_to_ideal_weights.values() )
         
-        ideal_locations_to_normalised_weights = { location : weight / total_weight for ( location, weight ) in list(locations_to_ideal_weights.items()) }
-        
-        current_locations_to_normalised_weights = collections.defaultdict( lambda: 0 )
+        ideal_locations_to_normalised_weights = { location : weight / total_weight for ( location, weight ) in locations_to_ideal_weights.items() }
         
-        file_prefixes = [ prefix for prefix in self._prefixes_to_locations if prefix.startswith( 'f' ) ]
+        current_locations_to_normalised_weights = { location : len( file_prefixes ) / 256 for ( location, file_prefixes ) in self._locations_to_file_prefixes.items() }
         
-        for file_prefix in file_prefixes:
-            
-            location = self._prefixes_to_locations[ file_prefix ]
-            
-            current_locations_to_normalised_weights[ location ] += 1.0 / 256
-            
-        
-        for location in list(current_locations_to_normalised_weights.keys()):
+        for location in current_locations_to_normalised_weights.keys():
             
             if location not in ideal_locations_to_normalised_weights:
                 
@@ -456,10 +797,12 @@ class ClientFilesManager( object ):
         
         #
         
-        overweight_locations = []
-        underweight_locations = []
+        # we only ever move one prefix per pass, so the first overweight and first underweight location are all we need--no point building full lists just to pop their heads
+        
+        overweight_location = None
+        underweight_location = None
         
-        for ( location, ideal_weight ) in list(ideal_locations_to_normalised_weights.items()):
+        for ( location, ideal_weight ) in ideal_locations_to_normalised_weights.items():
             
             if location in current_locations_to_normalised_weights:
                 
@@ -467,37 +810,42 @@ class ClientFilesManager( object ):
                 
                 if current_weight < ideal_weight:
                     
-                    underweight_locations.append( location )
+                    if underweight_location is None:
+                        
+                        underweight_location = location
+                        
                     
                 elif current_weight >= ideal_weight + 1.0 / 256:
                     
-                    overweight_locations.append( location )
+                    if overweight_location is None:
+                        
+                        overweight_location = location
+                        
                     
                 
             else:
                 
-                underweight_locations.append( location )
+                if underweight_location is None:
+                    
+                    underweight_location = location
+                    
+                
+            
+            if overweight_location is not None and underweight_location is not None:
+                
+                break
                 
             
         
         #
         
-        if len( underweight_locations ) > 0 and len( overweight_locations ) > 0:
+        if overweight_location is not None and underweight_location is not None:
             
-            overweight_location = overweight_locations.pop( 0 )
-            underweight_location = underweight_locations.pop( 0 )
+            # any prefix from the overweight bucket will do, no need to shuffle and scan the whole list
             
-            random.shuffle( file_prefixes )
+            file_prefix = random.choice( self._locations_to_file_prefixes[ overweight_location ] )
             
-            for file_prefix in file_prefixes:
-                
-                location = self._prefixes_to_locations[ file_prefix ]
-                
-                if location == overweight_location:
-                    
-                    return ( file_prefix, overweight_location, underweight_location )
-                    
-                
+            return ( file_prefix, overweight_location, underweight_location )
             
         else:
             
@@ -528,61 +876,132 @@ class ClientFilesManager( object ):
         return None
         
     
-    def _IterateAllFilePaths( self ):
+    def _GetShardLock( self, hash ):
+        
+        return self._prefix_shard_locks[ hash[0] ]
+        
+    
+    def _IterateAllFileDirEntries( self ):
+        
+        return self._IterateAllDirEntriesForPrefixType( 'f' )
         
-        for ( prefix, location ) in list(self._prefixes_to_locations.items()):
+    
+    def _IterateAllDirEntriesForPrefixType( self, desired_prefix_type ):
+        
+        def scan( dir ):
             
-            if prefix.startswith( 'f' ):
-                
-                dir = os.path.join( location, prefix )
+            # the DirEntries carry name and joined path for free, so consumers need no os.path.split or os.path.join per file
+            
+            with os.scandir( dir ) as dir_entries:
                 
-                filenames = list( os.listdir( dir ) )
-                
-                for filename in filenames:
-                    
-                    yield os.path.join( dir, filename )
-                    
+                return list( dir_entries )
                 
             
         
-    
-    def _IterateAllThumbnailPaths( self ):
+        dirs = [ os.path.join( location, prefix ) for ( prefix, location ) in self._prefixes_to_locations.items() if prefix.startswith( desired_prefix_type ) ]
         
-        for ( prefix, location ) in list(self._prefixes_to_locations.items()):
+        # each scandir is a blocking syscall that releases the GIL, so a pool of workers hides the per-directory latency of slow drives
+        # we keep the pool modest--256 concurrent scans would just thrash a spinning disk
+        
+        with concurrent.futures.ThreadPoolExecutor( max_workers = 16 ) as executor:
+            
+            # keep a bounded window of scans in flight--submitting all 256 up front would pin every completed listing in memory while a slow consumer chewed through them
+            
+            pending_futures = collections.deque()
             
-            if prefix.startswith( 't' ):
+            for dir in dirs:
                 
-                dir = os.path.join( location, prefix )
+                pending_futures.append( executor.submit( scan, dir ) )
+                
+                if len( pending_futures ) >= 16:
+                    
+                    for dir_entry in pending_futures.popleft().result():
+                        
+                        yield dir_entry
+                        
+                    
                 
-                filenames = list( os.listdir( dir ) )
+            
+            while len( pending_futures ) > 0:
                 
-                for filename in filenames:
+                for dir_entry in pending_futures.popleft().result():
                     
-                    yield os.path.join( dir, filename )
+                    yield dir_entry
                     
                 
             
         
     
-    def _LookForFilePath( self, hash ):
+    def _IterateAllThumbnailDirEntries( self ):
         
-        for potential_mime in HC.ALLOWED_MIMES:
-            
-            potential_path = self._GenerateExpectedFilePath( hash, potential_mime )
+        return self._IterateAllDirEntriesForPrefixType( 't' )
+        
+    
+    def _LocklessThumbnailExists( self, hash ):
+        
+        # a media browser will test the same thumbnails over and over as the user scrolls about, and one readdir of a prefix directory answers existence for every thumbnail inside it, so we cache whole listings rather than paying a stat per test
+        # single gets and stores on a builtin dict are atomic under the GIL, so this needs no lock of its own
+        
+        prefix_byte = hash[0]
+        
+        listing_entry = self._t_prefix_listings.get( prefix_byte )
+        
+        if listing_entry is None or HydrusData.TimeHasPassed( listing_entry[1] ):
             
-            if os.path.exists( potential_path ):
+            try:
                 
-                return ( potential_path, potential_mime )
+                with os.scandir( self._t_prefix_dirs[ prefix_byte ] ) as dir_entries:
+                    
+                    names = { dir_entry.name for dir_entry in dir_entries }
+                    
+                
+            except OSError:
                 
+                names = set()
+                
+            
+            listing_entry = ( names, HydrusData.GetNow() + 30 )
             
+            self._t_prefix_listings[ prefix_byte ] = listing_entry
+            
+        
+        return hash.hex() + '.thumbnail' in listing_entry[0]
+        
+    
+    def _LookForFilePath( self, hash ):
+        
+        self._WaitOnWakeup()
         
         hash_encoded = hash.hex()
         
-        prefix = 'f' + hash_encoded[:2]
+        subdir = self._f_prefix_dirs[ hash[0] ]
         
-        location = self._prefixes_to_locations[ prefix ]
+        # one readdir discovers whatever ext is actually on disk, rather than an exists probe per allowed mime
         
-        subdir = os.path.join( location, prefix )
+        try:
+            
+            with os.scandir( subdir ) as dir_entries:
+                
+                found_exts = { dir_entry.name[64:] for dir_entry in dir_entries if dir_entry.name.startswith( hash_encoded ) }
+                
+            
+        except OSError:
+            
+            found_exts = set()
+            
+        
+        if len( found_exts ) > 0:
+            
+            # in the rare case neighbour dupes exist, we return the first allowed mime, just as the old per-mime probe did
+            
+            for potential_mime in HC.ALLOWED_MIMES:
+                
+                if mime_ext_lookup[ potential_mime ] in found_exts:
+                    
+                    return ( subdir + os.sep + hash_encoded + mime_ext_lookup[ potential_mime ], potential_mime )
+                    
+                
+            
         
         if not os.path.exists( subdir ):
             
@@ -600,7 +1019,7 @@ class ClientFilesManager( object ):
             
             try:
                 
-                for ( prefix, location ) in list( self._prefixes_to_locations.items() ):
+                for ( prefix, location ) in self._prefixes_to_locations.items():
                     
                     HydrusPaths.MakeSureDirectoryExists( location )
                     
@@ -681,28 +1100,82 @@ class ClientFilesManager( object ):
                 
             
         
+        # the prefixes are a fixed dense keyspace, so fold the locations into tuples indexed by a hash's first byte
+        # the hot path lookups then skip the string build and dict probe entirely; the dict stays for code that iterates prefixes symbolically
+        
+        self._f_prefix_locations = tuple( self._prefixes_to_locations[ prefix ] for prefix in prefix_f_lookup )
+        self._t_prefix_locations = tuple( self._prefixes_to_locations[ prefix ] for prefix in prefix_t_lookup )
+        
+        # and the joined per-prefix dirs too, so generating a path is one index and one concat
+        
+        self._f_prefix_dirs = tuple( os.path.join( self._prefixes_to_locations[ prefix ], prefix ) for prefix in prefix_f_lookup )
+        self._t_prefix_dirs = tuple( os.path.join( self._prefixes_to_locations[ prefix ], prefix ) for prefix in prefix_t_lookup )
+        
+        self._t_prefix_listings = {}
+        
+        # the rebalancer asks 'which file prefixes live in this location?', so let's flip the mapping for it here rather than scanning all 256 rows every time
+        
+        self._locations_to_file_prefixes = collections.defaultdict( list )
+        
+        for prefix in prefix_f_lookup:
+            
+            self._locations_to_file_prefixes[ self._prefixes_to_locations[ prefix ] ].append( prefix )
+            
+        
+        # the set of distinct locations only changes on a reinit, so the checks that want it need not rebuild it every call
+        
+        self._distinct_locations = frozenset( self._prefixes_to_locations.values() )
+        
     
     def _ReinitMissingLocations( self ):
         
         self._missing_locations = set()
         
+        # many prefixes share a location, so one stat and one readdir per location beats two stats per ( prefix, location ) pair
+        
+        locations_to_prefixes = collections.defaultdict( list )
+        
         for ( prefix, location ) in self._prefixes_to_locations.items():
             
-            if os.path.exists( location ):
+            locations_to_prefixes[ location ].append( prefix )
+            
+        
+        for ( location, prefixes ) in locations_to_prefixes.items():
+            
+            present_prefixes = set()
+            
+            try:
                 
-                if os.path.exists( os.path.join( location, prefix ) ):
+                with os.scandir( location ) as dir_entries:
                     
-                    continue
+                    present_prefixes = { dir_entry.name for dir_entry in dir_entries if dir_entry.is_dir() }
                     
                 
+            except OSError:
+                
+                pass
+                
             
-            self._missing_locations.add( ( location, prefix ) )
+            for prefix in prefixes:
+                
+                if prefix not in present_prefixes:
+                    
+                    self._missing_locations.add( ( location, prefix ) )
+                    
+                
             
         
     
     def _WaitOnWakeup( self ):
         
-        if HG.client_controller.new_options.GetBoolean( 'file_system_waits_on_wakeup' ):
+        # this is hit on every file path we generate, so we latch the option to a plain attribute and refresh it on options save
+        
+        if self._waits_on_wakeup is None:
+            
+            self._waits_on_wakeup = HG.client_controller.new_options.GetBoolean( 'file_system_waits_on_wakeup' )
+            
+        
+        if self._waits_on_wakeup:
             
             while HG.client_controller.JustWokeFromSleep():
                 
@@ -721,9 +1194,7 @@ class ClientFilesManager( object ):
             
             client_files_default = os.path.join( db_dir, 'client_files' )
             
-            all_locations = set( self._prefixes_to_locations.values() )
-            
-            return False not in ( location.startswith( client_files_default ) for location in all_locations )
+            return all( location.startswith( client_files_default ) for location in self._distinct_locations )
             
         
     
@@ -738,15 +1209,35 @@ class ClientFilesManager( object ):
         
         HydrusPaths.MakeFileWriteable( dest_path )
         
-        with open( dest_path, 'wb' ) as f:
+        # we have the complete bytes object in hand, so write through a raw fd, setting sensible permission bits at creation, and skip the BufferedWriter machinery
+        
+        flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC
+        
+        if hasattr( os, 'O_BINARY' ):
             
-            f.write( file_bytes )
+            flags |= os.O_BINARY
+            
+        
+        fd = os.open( dest_path, flags, 0o644 )
+        
+        try:
+            
+            num_written = os.write( fd, file_bytes )
+            
+            while num_written < len( file_bytes ):
+                
+                num_written += os.write( fd, memoryview( file_bytes )[ num_written : ] )
+                
+            
+        finally:
+            
+            os.close( fd )
             
         
     
     def AddFile( self, hash, mime, source_path, thumbnail_bytes = None ):
         
-        with self._rwlock.write:
+        with self._rwlock.read, self._GetShardLock( hash ):
             
             self._AddFile( hash, mime, source_path )
             
@@ -759,7 +1250,7 @@ class ClientFilesManager( object ):
     
     def AddThumbnailFromBytes( self, hash, thumbnail_bytes, silent = False ):
         
-        with self._rwlock.write:
+        with self._rwlock.read, self._GetShardLock( hash ):
             
             self._AddThumbnailFromBytes( hash, thumbnail_bytes, silent = silent )
             
@@ -767,7 +1258,7 @@ class ClientFilesManager( object ):
     
     def ChangeFileExt( self, hash, old_mime, mime ):
         
-        with self._rwlock.write:
+        with self._rwlock.read, self._GetShardLock( hash ):
             
             return self._ChangeFileExt( hash, old_mime, mime )
             
@@ -787,7 +1278,11 @@ class ClientFilesManager( object ):
             orphan_paths = []
             orphan_thumbnails = []
             
-            for ( i, path ) in enumerate( self._IterateAllFilePaths() ):
+            # we ask the db about a whole chunk of files in one read call, rather than one round-trip per file
+            
+            num_files_reviewed = 0
+            
+            for dir_entries in HydrusData.SplitIteratorIntoChunks( self._IterateAllFileDirEntries(), 1024 ):
                 
                 ( i_paused, should_quit ) = job_key.WaitIfNeeded()
                 
@@ -796,31 +1291,37 @@ class ClientFilesManager( object ):
                     return
                     
                 
-                if i % 100 == 0:
-                    
-                    status = 'reviewed ' + HydrusData.ToHumanInt( i ) + ' files, found ' + HydrusData.ToHumanInt( len( orphan_paths ) ) + ' orphans'
-                    
-                    job_key.SetVariable( 'popup_text_1', status )
-                    
+                status = 'reviewed ' + HydrusData.ToHumanInt( num_files_reviewed ) + ' files, found ' + HydrusData.ToHumanInt( len( orphan_paths ) ) + ' orphans'
                 
-                try:
-                    
-                    is_an_orphan = False
-                    
-                    ( directory, filename ) = os.path.split( path )
-                    
-                    should_be_a_hex_hash = filename[:64]
+                job_key.SetVariable( 'popup_text_1', status )
+                
+                hashes_and_paths = []
+                chunk_orphan_paths = []
+                
+                for dir_entry in dir_entries:
                     
-                    hash = bytes.fromhex( should_be_a_hex_hash )
+                    try:
+                        
+                        should_be_a_hex_hash = dir_entry.name[:64]
+                        
+                        hash = bytes.fromhex( should_be_a_hex_hash )
+                        
+                        hashes_and_paths.append( ( hash, dir_entry.path ) )
+                        
+                    except:
+                        
+                        chunk_orphan_paths.append( dir_entry.path )
+                        
                     
-                    is_an_orphan = HG.client_controller.Read( 'is_an_orphan', 'file', hash )
+                
+                if len( hashes_and_paths ) > 0:
                     
-                except:
+                    orphan_hashes = HG.client_controller.Read( 'are_orphans', 'file', { hash for ( hash, path ) in hashes_and_paths } )
                     
-                    is_an_orphan = True
+                    chunk_orphan_paths.extend( ( path for ( hash, path ) in hashes_and_paths if hash in orphan_hashes ) )
                     
                 
-                if is_an_orphan:
+                for path in chunk_orphan_paths:
                     
                     if move_location is not None:
                         
@@ -838,10 +1339,14 @@ class ClientFilesManager( object ):
                     orphan_paths.append( path )
                     
                 
+                num_files_reviewed += len( dir_entries )
+                
             
             time.sleep( 2 )
             
-            for ( i, path ) in enumerate( self._IterateAllThumbnailPaths() ):
+            num_thumbnails_reviewed = 0
+            
+            for dir_entries in HydrusData.SplitIteratorIntoChunks( self._IterateAllThumbnailDirEntries(), 1024 ):
                 
                 ( i_paused, should_quit ) = job_key.WaitIfNeeded()
                 
@@ -850,34 +1355,36 @@ class ClientFilesManager( object ):
                     return
                     
                 
-                if i % 100 == 0:
-                    
-                    status = 'reviewed ' + HydrusData.ToHumanInt( i ) + ' thumbnails, found ' + HydrusData.ToHumanInt( len( orphan_thumbnails ) ) + ' orphans'
-                    
-                    job_key.SetVariable( 'popup_text_1', status )
-                    
+                status = 'reviewed ' + HydrusData.ToHumanInt( num_thumbnails_reviewed ) + ' thumbnails, found ' + HydrusData.ToHumanInt( len( orphan_thumbnails ) ) + ' orphans'
                 
-                try:
-                    
-                    is_an_orphan = False
-                    
-                    ( directory, filename ) = os.path.split( path )
-                    
-                    should_be_a_hex_hash = filename[:64]
+                job_key.SetVariable( 'popup_text_1', status )
+                
+                hashes_and_paths = []
+                
+                for dir_entry in dir_entries:
                     
-                    hash = bytes.fromhex( should_be_a_hex_hash )
+                    try:
+                        
+                        should_be_a_hex_hash = dir_entry.name[:64]
+                        
+                        hash = bytes.fromhex( should_be_a_hex_hash )
+                        
+                        hashes_and_paths.append( ( hash, dir_entry.path ) )
+                        
+                    except:
+                        
+                        orphan_thumbnails.append( dir_entry.path )
+                        
                     
-                    is_an_orphan = HG.client_controller.Read( 'is_an_orphan', 'thumbnail', hash )
+                
+                if len( hashes_and_paths ) > 0:
                     
-                except:
+                    orphan_hashes = HG.client_controller.Read( 'are_orphans', 'thumbnail', { hash for ( hash, path ) in hashes_and_paths } )
                     
-                    is_an_orphan = True
+                    orphan_thumbnails.extend( ( path for ( hash, path ) in hashes_and_paths if hash in orphan_hashes ) )
                     
                 
-                if is_an_orphan:
-                    
-                    orphan_thumbnails.append( path )
-                    
+                num_thumbnails_reviewed += len( dir_entries )
                 
             
             time.sleep( 2 )
@@ -890,7 +1397,9 @@ class ClientFilesManager( object ):
                 
                 time.sleep( 5 )
                 
-                for ( i, path ) in enumerate( orphan_paths ):
+                num_done = 0
+                
+                for paths in HydrusData.SplitListIntoChunks( orphan_paths, 100 ):
                     
                     ( i_paused, should_quit ) = job_key.WaitIfNeeded()
                     
@@ -899,13 +1408,20 @@ class ClientFilesManager( object ):
                         return
                         
                     
-                    HydrusData.Print( 'Deleting the orphan ' + path )
-                    
-                    status = 'deleting orphan files: ' + HydrusData.ConvertValueRangeToPrettyString( i + 1, len( orphan_paths ) )
+                    status = 'deleting orphan files: ' + HydrusData.ConvertValueRangeToPrettyString( num_done + 1, len( orphan_paths ) )
                     
                     job_key.SetVariable( 'popup_text_1', status )
                     
-                    ClientPaths.DeletePath( path )
+                    for path in paths:
+                        
+                        ClientPaths.DeletePath( path )
+                        
+                    
+                    # one log write per batch, rather than a string build and print per file
+                    
+                    HydrusData.Print( 'Deleted orphan files:' + os.linesep + os.linesep.join( paths ) )
+                    
+                    num_done += len( paths )
                     
                 
             
@@ -917,7 +1433,9 @@ class ClientFilesManager( object ):
                 
                 time.sleep( 5 )
                 
-                for ( i, path ) in enumerate( orphan_thumbnails ):
+                num_done = 0
+                
+                for paths in HydrusData.SplitListIntoChunks( orphan_thumbnails, 100 ):
                     
                     ( i_paused, should_quit ) = job_key.WaitIfNeeded()
                     
@@ -926,14 +1444,24 @@ class ClientFilesManager( object ):
                         return
                         
                     
-                    status = 'deleting orphan thumbnails: ' + HydrusData.ConvertValueRangeToPrettyString( i + 1, len( orphan_thumbnails ) )
+                    status = 'deleting orphan thumbnails: ' + HydrusData.ConvertValueRangeToPrettyString( num_done + 1, len( orphan_thumbnails ) )
                     
                     job_key.SetVariable( 'popup_text_1', status )
                     
-                    HydrusData.Print( 'Deleting the orphan ' + path )
+                    for path in paths:
+                        
+                        ClientPaths.DeletePath( path, always_delete_fully = True )
+                        
                     
-                    ClientPaths.DeletePath( path, always_delete_fully = True )
+                    HydrusData.Print( 'Deleted orphan thumbnails:' + os.linesep + os.linesep.join( paths ) )
                     
+                    num_done += len( paths )
+                    
+                
+            
+            if len( orphan_thumbnails ) > 0:
+                
+                self._t_prefix_listings = {}
                 
             
             if len( orphan_paths ) == 0 and len( orphan_thumbnails ) == 0:
@@ -964,23 +1492,26 @@ class ClientFilesManager( object ):
         
         big_pauser = HydrusData.BigJobPauser( period = 1 )
         
-        for hashes_chunk in HydrusData.SplitIteratorIntoChunks( hashes, 10 ):
+        for hashes_chunk in HydrusData.SplitIteratorIntoChunks( hashes, 25 ):
             
-            with self._rwlock.write:
+            with self._rwlock.read:
                 
                 for hash in hashes_chunk:
                     
-                    try:
-                        
-                        ( path, mime ) = self._LookForFilePath( hash )
+                    with self._GetShardLock( hash ):
                         
-                    except HydrusExceptions.FileMissingException:
+                        try:
+                            
+                            ( path, mime ) = self._LookForFilePath( hash )
+                            
+                        except HydrusExceptions.FileMissingException:
+                            
+                            continue
+                            
                         
-                        continue
+                        ClientPaths.DeletePath( path )
                         
                     
-                    ClientPaths.DeletePath( path )
-                    
                 
             
             big_pauser.Pause()
@@ -998,15 +1529,25 @@ class ClientFilesManager( object ):
         
         big_pauser = HydrusData.BigJobPauser( period = 1 )
         
-        for hashes_chunk in HydrusData.SplitIteratorIntoChunks( hashes, 20 ):
+        for hashes_chunk in HydrusData.SplitIteratorIntoChunks( hashes, 50 ):
             
-            with self._rwlock.write:
+            with self._rwlock.read:
                 
                 for hash in hashes_chunk:
                     
-                    path = self._GenerateExpectedThumbnailPath( hash )
-                    
-                    ClientPaths.DeletePath( path, always_delete_fully = True )
+                    with self._GetShardLock( hash ):
+                        
+                        path = self._GenerateExpectedThumbnailPath( hash )
+                        
+                        ClientPaths.DeletePath( path, always_delete_fully = True )
+                        
+                        listing_entry = self._t_prefix_listings.get( hash[0] )
+                        
+                        if listing_entry is not None:
+                            
+                            listing_entry[0].discard( hash.hex() + '.thumbnail' )
+                            
+                        
                     
                 
             
@@ -1016,7 +1557,7 @@ class ClientFilesManager( object ):
     
     def DeleteNeighbourDupes( self, hash, true_mime ):
         
-        with self._rwlock.write:
+        with self._rwlock.read, self._GetShardLock( hash ):
             
             correct_path = self._GenerateExpectedFilePath( hash, true_mime )
             
@@ -1025,26 +1566,27 @@ class ClientFilesManager( object ):
                 return # misfire, let's not actually delete the right one
                 
             
-            for mime in HC.ALLOWED_MIMES:
+            hash_encoded = hash.hex()
+            
+            correct_filename = hash_encoded + mime_ext_lookup[ true_mime ]
+            
+            # one readdir surfaces any dupes directly, rather than an exists probe per allowed mime
+            
+            try:
                 
-                if mime == true_mime:
+                with os.scandir( self._f_prefix_dirs[ hash[0] ] ) as dir_entries:
                     
-                    continue
+                    incorrect_paths = [ dir_entry.path for dir_entry in dir_entries if dir_entry.name.startswith( hash_encoded ) and dir_entry.name != correct_filename ]
                     
                 
-                incorrect_path = self._GenerateExpectedFilePath( hash, mime )
+            except OSError:
                 
-                if incorrect_path == correct_path:
-                    
-                    # some diff mimes have the same ext
-                    
-                    continue
-                    
+                return
                 
-                if os.path.exists( incorrect_path ):
-                    
-                    HydrusPaths.DeletePath( incorrect_path )
-                    
+            
+            for incorrect_path in incorrect_paths:
+                
+                HydrusPaths.DeletePath( incorrect_path )
                 
             
         
@@ -1053,23 +1595,59 @@ class ClientFilesManager( object ):
         
         with self._rwlock.read:
             
-            locations = set()
+            return set( self._locations_to_file_prefixes.keys() )
+            
+        
+    
+    def GetFileModifiedTimestamps( self, medias ):
+        
+        # grouping by prefix lets one scandir serve a whole directory's worth of mtimes from its cached stat data
+        
+        hashes_to_timestamps = {}
+        
+        prefixes_to_medias = collections.defaultdict( list )
+        
+        for media in medias:
+            
+            prefixes_to_medias[ media.GetHash()[0] ].append( media )
+            
+        
+        with self._rwlock.read:
             
-            for ( prefix, location ) in self._prefixes_to_locations.items():
+            for ( prefix_byte, prefix_medias ) in prefixes_to_medias.items():
                 
-                if prefix.startswith( 'f' ):
+                try:
+                    
+                    with os.scandir( self._f_prefix_dirs[ prefix_byte ] ) as dir_entries:
+                        
+                        names_to_timestamps = { dir_entry.name : int( dir_entry.stat().st_mtime ) for dir_entry in dir_entries }
+                        
                     
-                    locations.add( location )
+                except OSError:
+                    
+                    names_to_timestamps = {}
+                    
+                
+                for media in prefix_medias:
+                    
+                    hash = media.GetHash()
+                    
+                    name = hash.hex() + mime_ext_lookup[ media.GetMime() ]
+                    
+                    if name in names_to_timestamps:
+                        
+                        hashes_to_timestamps[ hash ] = names_to_timestamps[ name ]
+                        
                     
                 
             
-            return locations
-            
+        
+        return hashes_to_timestamps
         
     
     def GetFilePath( self, hash, mime = None, check_file_exists = True ):
         
-        with self._rwlock.read:
+        with self._rwlock.read, self._GetShardLock( hash ):
             
             if HG.file_report_mode:
                 
@@ -1122,16 +1700,30 @@ class ClientFilesManager( object ):
             HydrusData.ShowText( 'Thumbnail path request: ' + str( ( hash, mime ) ) )
             
         
-        with self._rwlock.read:
-            
-            path = self._GenerateExpectedThumbnailPath( hash )
-            
-            thumb_missing = not os.path.exists( path )
-            
+        path = self._GenerateExpectedThumbnailPath( hash )
+        
+        # the hit path is answered straight from the listing cache with no locks at all
         
-        if thumb_missing:
+        if not self._LocklessThumbnailExists( hash ) and mime in HC.MIMES_WITH_THUMBNAILS:
             
-            self.RegenerateThumbnail( media )
+            with self._rwlock.read, self._GetShardLock( hash ):
+                
+                # double-check under the lock--another thread may have regenerated it while we were queueing
+                
+                if not os.path.exists( path ):
+                    
+                    file_path = self._GenerateExpectedFilePath( hash, mime )
+                    
+                    if not os.path.exists( file_path ):
+                        
+                        raise HydrusExceptions.FileMissingException( 'The thumbnail for file ' + hash.hex() + ' could not be regenerated from the original file because the original file is missing! This event could indicate hard drive corruption. Please check everything is ok.' )
+                        
+                    
+                    thumbnail_bytes = self._GenerateThumbnailBytes( file_path, media )
+                    
+                    self._AddThumbnailFromBytes( hash, thumbnail_bytes )
+                    
+                
             
         
         return path
@@ -1139,14 +1731,17 @@ class ClientFilesManager( object ):
     
     def LocklessHasThumbnail( self, hash ):
         
-        path = self._GenerateExpectedThumbnailPath( hash )
-        
         if HG.file_report_mode:
             
-            HydrusData.ShowText( 'Thumbnail path test: ' + path )
+            HydrusData.ShowText( 'Thumbnail path test: ' + self._GenerateExpectedThumbnailPath( hash ) )
             
         
-        return os.path.exists( path )
+        return self._LocklessThumbnailExists( hash )
+        
+    
+    def NotifyNewOptions( self ):
+        
+        self._waits_on_wakeup = None
         
     
     def Rebalance( self, job_key ):
@@ -1179,6 +1774,8 @@ class ClientFilesManager( object ):
                     
                     job_key.SetVariable( 'popup_text_1', text )
                     
+                    precise_timestamp = HydrusData.GetNowPrecise()
+                    
                     # these two lines can cause a deadlock because the db sometimes calls stuff in here.
                     self._controller.WriteSynchronous( 'relocate_client_files', prefix, overweight_location, underweight_location )
                     
@@ -1186,7 +1783,14 @@ class ClientFilesManager( object ):
                     
                     rebalance_tuple = self._GetRebalanceTuple()
                     
-                    time.sleep( 0.01 )
+                    # yield between moves so the rest of the client can breathe, but only pad out moves that finished fast--a flat sleep adds up to real time over thousands of prefixes
+                    
+                    work_period = HydrusData.GetNowPrecise() - precise_timestamp
+                    
+                    if work_period < 0.005:
+                        
+                        time.sleep( 0.005 - work_period )
+                        
                     
                 
                 recover_tuple = self._GetRecoverTuple()
@@ -1209,11 +1813,18 @@ class ClientFilesManager( object ):
                     recoverable_path = os.path.join( recoverable_location, prefix )
                     correct_path = os.path.join( correct_location, prefix )
                     
+                    precise_timestamp = HydrusData.GetNowPrecise()
+                    
                     HydrusPaths.MergeTree( recoverable_path, correct_path )
                     
                     recover_tuple = self._GetRecoverTuple()
                     
-                    time.sleep( 0.01 )
+                    work_period = HydrusData.GetNowPrecise() - precise_timestamp
+                    
+                    if work_period < 0.005:
+                        
+                        time.sleep( 0.005 - work_period )
+                        
                     
                 
             
@@ -1245,7 +1856,7 @@ class ClientFilesManager( object ):
             return
             
         
-        with self._rwlock.read:
+        with self._rwlock.read, self._GetShardLock( hash ):
             
             file_path = self._GenerateExpectedFilePath( hash, mime )
             
@@ -1254,15 +1865,87 @@ class ClientFilesManager( object ):
                 raise HydrusExceptions.FileMissingException( 'The thumbnail for file ' + hash.hex() + ' could not be regenerated from the original file because the original file is missing! This event could indicate hard drive corruption. Please check everything is ok.')
                 
             
-            thumbnail_bytes = self._GenerateThumbnailBytes( file_path, media )
-            
         
-        with self._rwlock.write:
+        # the decode/resize is the expensive cpu bit and does not need the lock--only path resolution and the final write do
+        
+        thumbnail_bytes = self._GenerateThumbnailBytes( file_path, media )
+        
+        with self._rwlock.read, self._GetShardLock( hash ):
             
             self._AddThumbnailFromBytes( hash, thumbnail_bytes )
             
         
     
+    def RegenerateThumbnails( self, medias ):
+        
+        # thumbnail generation is cpu-bound decode/resize work, while the final write is cheap io
+        # opencv and pillow release the GIL for the heavy lifting, so a thread pool here gets us real multi-core parallelism without the pickling and frozen-build problems a process pool would bring
+        
+        medias = [ media for media in medias if media.GetMime() in HC.MIMES_WITH_THUMBNAILS ]
+        
+        if len( medias ) == 0:
+            
+            return
+            
+        
+        bounding_dimensions = HG.client_controller.options[ 'thumbnail_dimensions' ]
+        percentage_in = self._controller.new_options.GetInteger( 'video_thumbnail_percentage_in' )
+        
+        def generate( media ):
+            
+            hash = media.GetHash()
+            mime = media.GetMime()
+            
+            with self._rwlock.read, self._GetShardLock( hash ):
+                
+                file_path = self._GenerateExpectedFilePath( hash, mime )
+                
+                if not os.path.exists( file_path ):
+                    
+                    raise HydrusExceptions.FileMissingException( 'The thumbnail for file ' + hash.hex() + ' could not be regenerated from the original file because the original file is missing! This event could indicate hard drive corruption. Please check everything is ok.' )
+                    
+                
+            
+            # decode outside the lock so the workers do not serialise against writers while they chew on big images
+            
+            thumbnail_bytes = self._GenerateThumbnailBytes( file_path, media, bounding_dimensions = bounding_dimensions, percentage_in = percentage_in )
+            
+            return ( hash, thumbnail_bytes )
+            
+        
+        num_workers = os.cpu_count() or 1
+        
+        with concurrent.futures.ThreadPoolExecutor( max_workers = num_workers ) as executor:
+            
+            generation_futures = { executor.submit( generate, media ) for media in medias }
+            
+            for generation_future in concurrent.futures.as_completed( generation_futures ):
+                
+                try:
+                    
+                    ( hash, thumbnail_bytes ) = generation_future.result()
+                    
+                except HydrusExceptions.FileMissingException:
+                    
+                    continue
+                    
+                except Exception as e:
+                    
+                    # one corrupt or undecodable file must not abandon the rest of the batch
+                    
+                    HydrusData.PrintException( e )
+                    
+                    continue
+                    
+                
+                with self._rwlock.read, self._GetShardLock( hash ):
+                    
+                    self._AddThumbnailFromBytes( hash, thumbnail_bytes )
+                    
+                
+            
+        
+    
     def RegenerateThumbnailIfWrongSize( self, media ):
         
         do_it = False
@@ -1281,9 +1964,7 @@ class ClientFilesManager( object ):
             
             path = self._GenerateExpectedThumbnailPath( hash )
             
-            numpy_image = ClientImageHandling.GenerateNumPyImage( path, mime )
-            
-            ( current_width, current_height ) = HydrusImageHandling.GetResolutionNumPy( numpy_image )
+            ( current_width, current_height ) = HydrusImageHandling.GetImageResolution( path )
             
             bounding_dimensions = self._controller.options[ 'thumbnail_dimensions' ]
             
@@ -1322,6 +2003,14 @@ class FilesMaintenanceManager( object ):
         self._active_work_rules = HydrusNetworking.BandwidthRules()
         
         self._jobs_since_last_gc_collect = 0
+        self._interior_flush_count = 0
+        
+        self._known_missing_this_pass = set()
+        self._extra_hashes_this_pass = {}
+        self._phashes_this_pass = {}
+        self._url_classes_this_pass = {}
+        
+        self._all_urls_buffer = []
         
         self._ReInitialiseWorkRules()
         
@@ -1330,7 +2019,7 @@ class FilesMaintenanceManager( object ):
         
         self._wake_background_event = threading.Event()
         self._reset_background_event = threading.Event()
-        self._shutdown = False
+        self._shutdown_event = threading.Event()
         
         self._controller.sub( self, 'NotifyNewOptions', 'notify_new_options' )
         self._controller.sub( self, 'Shutdown', 'shutdown' )
@@ -1373,22 +2062,45 @@ class FilesMaintenanceManager( object ):
         file_is_missing = False
         file_is_invalid = False
         
-        try:
-            
-            path = self._controller.client_files_manager.GetFilePath( hash, mime )
+        if hash in self._known_missing_this_pass:
             
-        except HydrusExceptions.FileMissingException:
+            # we already confirmed this one gone earlier in the pass, so don't hit the disk for it again
+            # we do still fall through to the full missing-file handling--a different integrity job type for the same file may want to queue a redownload or delete the record
             
             file_is_missing = True
             
-            HydrusData.DebugPrint( 'Missing file: {}!'.format( hash.hex() ) )
+        else:
+            
+            try:
+                
+                path = self._controller.client_files_manager.GetFilePath( hash, mime )
+                
+            except HydrusExceptions.FileMissingException:
+                
+                file_is_missing = True
+                
+                self._known_missing_this_pass.add( hash )
+                
+                HydrusData.DebugPrint( 'Missing file: {}!'.format( hash.hex() ) )
+                
             
         
-        if not file_is_missing and job_type in ( REGENERATE_FILE_DATA_JOB_FILE_INTEGRITY_DATA, REGENERATE_FILE_DATA_JOB_FILE_INTEGRITY_DATA_URL, REGENERATE_FILE_DATA_JOB_FILE_INTEGRITY_DATA_SILENT_DELETE ):
+        if not file_is_missing and job_type in FILE_INTEGRITY_DATA_JOBS:
+            
+            # one read serves the integrity check and any other-hashes job queued for this file in the same pass
             
-            actual_hash = HydrusFileHandling.GetHashFromPath( path )
+            ( actual_hash, md5, sha1, sha512 ) = HydrusFileHandling.GetAllHashesFromPath( path, avoid_cache_pollution = True )
             
-            if hash != actual_hash:
+            if hash == actual_hash:
+                
+                if len( self._extra_hashes_this_pass ) > 10000:
+                    
+                    self._extra_hashes_this_pass = {}
+                    
+                
+                self._extra_hashes_this_pass[ hash ] = ( md5, sha1, sha512 )
+                
+            else:
                 
                 file_is_invalid = True
                 
@@ -1408,22 +2120,15 @@ class FilesMaintenanceManager( object ):
                 
                 with open( os.path.join( error_dir, hash.hex() + '.urls.txt' ), 'w', encoding = 'utf-8' ) as f:
                     
-                    for url in urls:
-                        
-                        f.write( url )
-                        f.write( os.linesep )
-                        
-                    
-                
-                with open( os.path.join( error_dir, 'all_urls.txt' ), 'a', encoding = 'utf-8' ) as f:
+                    # joining in one go keeps this to a single write call rather than two per url
                     
-                    for url in urls:
-                        
-                        f.write( url )
-                        f.write( os.linesep )
-                        
+                    f.write( ''.join( ( url + os.linesep for url in urls ) ) )
                     
                 
+                # the shared all_urls.txt gets one open/flush per batch rather than per bad file
+                
+                self._all_urls_buffer.extend( urls )
+                
             
             useful_urls = []
             
@@ -1431,13 +2136,29 @@ class FilesMaintenanceManager( object ):
                 
                 add_it = False
                 
-                try:
+                # files from the same site share urls across a pass, and the class lookup walks every rule the domain manager has, so memoise it
+                
+                if url in self._url_classes_this_pass:
                     
-                    url_class = HG.client_controller.network_engine.domain_manager.GetURLClass( url )
+                    url_class = self._url_classes_this_pass[ url ]
                     
-                except HydrusExceptions.URLClassException:
+                else:
                     
-                    continue
+                    try:
+                        
+                        url_class = HG.client_controller.network_engine.domain_manager.GetURLClass( url )
+                        
+                    except HydrusExceptions.URLClassException:
+                        
+                        continue
+                        
+                    
+                    if len( self._url_classes_this_pass ) > 10000:
+                        
+                        self._url_classes_this_pass = {}
+                        
+                    
+                    self._url_classes_this_pass[ url ] = url_class
                     
                 
                 if url_class is None:
@@ -1458,9 +2179,9 @@ class FilesMaintenanceManager( object ):
                     
                 
             
-            delete_record = job_type in ( REGENERATE_FILE_DATA_JOB_FILE_INTEGRITY_PRESENCE, REGENERATE_FILE_DATA_JOB_FILE_INTEGRITY_DATA )
-            try_redownload = job_type in ( REGENERATE_FILE_DATA_JOB_FILE_INTEGRITY_PRESENCE_URL, REGENERATE_FILE_DATA_JOB_FILE_INTEGRITY_DATA_URL ) and len( useful_urls ) > 0
-            do_export = file_is_invalid and ( job_type in ( REGENERATE_FILE_DATA_JOB_FILE_INTEGRITY_DATA, REGENERATE_FILE_DATA_JOB_FILE_INTEGRITY_DATA_SILENT_DELETE ) or ( job_type == REGENERATE_FILE_DATA_JOB_FILE_INTEGRITY_DATA_URL and try_redownload ) )
+            delete_record = job_type in FILE_INTEGRITY_DELETE_RECORD_JOBS
+            try_redownload = job_type in FILE_INTEGRITY_TRY_REDOWNLOAD_JOBS and len( useful_urls ) > 0
+            do_export = file_is_invalid and ( job_type in FILE_INTEGRITY_EXPORT_JOBS or ( job_type == REGENERATE_FILE_DATA_JOB_FILE_INTEGRITY_DATA_URL and try_redownload ) )
             
             if do_export:
                 
@@ -1484,15 +2205,12 @@ class FilesMaintenanceManager( object ):
             
             if delete_record:
                 
-                content_update = HydrusData.ContentUpdate( HC.CONTENT_TYPE_FILES, HC.CONTENT_UPDATE_DELETE, ( hash, ), reason = 'Record deleted during File Integrity check.' )
+                content_updates = []
                 
-                service_keys_to_content_updates = { CC.COMBINED_LOCAL_FILE_SERVICE_KEY : [ content_update ] }
+                content_updates.append( HydrusData.ContentUpdate( HC.CONTENT_TYPE_FILES, HC.CONTENT_UPDATE_DELETE, ( hash, ), reason = 'Record deleted during File Integrity check.' ) )
+                content_updates.append( HydrusData.ContentUpdate( HC.CONTENT_TYPE_FILES, HC.CONTENT_UPDATE_ADVANCED, ( 'delete_deleted', ( hash, ) ) ) )
                 
-                self._controller.WriteSynchronous( 'content_updates', service_keys_to_content_updates )
-                
-                content_update = HydrusData.ContentUpdate( HC.CONTENT_TYPE_FILES, HC.CONTENT_UPDATE_ADVANCED, ( 'delete_deleted', ( hash, ) ) )
-                
-                service_keys_to_content_updates = { CC.COMBINED_LOCAL_FILE_SERVICE_KEY : [ content_update ] }
+                service_keys_to_content_updates = { CC.COMBINED_LOCAL_FILE_SERVICE_KEY : content_updates }
                 
                 self._controller.WriteSynchronous( 'content_updates', service_keys_to_content_updates )
                 
@@ -1553,6 +2271,23 @@ class FilesMaintenanceManager( object ):
         self._controller.client_files_manager.DeleteNeighbourDupes( hash, mime )
         
     
+    def _DoInteriorClearedJobsFlush( self, cleared_jobs ):
+        
+        # fire-and-forget here lets the loop keep computing while the db thread persists the last batch
+        # every eighth flush goes synchronous so a slow db cannot pile up unbounded pending batches behind us
+        
+        self._interior_flush_count += 1
+        
+        if self._interior_flush_count % 8 == 0:
+            
+            self._controller.WriteSynchronous( 'file_maintenance_clear_jobs', cleared_jobs )
+            
+        else:
+            
+            self._controller.Write( 'file_maintenance_clear_jobs', cleared_jobs )
+            
+        
+    
     def _FixFilePermissions( self, media_result ):
         
         hash = media_result.GetHash()
@@ -1570,6 +2305,61 @@ class FilesMaintenanceManager( object ):
             
         
     
+    def _FlushAllURLsBuffer( self ):
+        
+        if len( self._all_urls_buffer ) == 0:
+            
+            return
+            
+        
+        error_dir = os.path.join( self._controller.GetDBDir(), 'missing_and_invalid_files' )
+        
+        HydrusPaths.MakeSureDirectoryExists( error_dir )
+        
+        with open( os.path.join( error_dir, 'all_urls.txt' ), 'a', encoding = 'utf-8' ) as f:
+            
+            f.write( ''.join( ( url + os.linesep for url in self._all_urls_buffer ) ) )
+            
+        
+        self._all_urls_buffer = []
+        
+    
+    def _PrefetchMediaResultFiles( self, media_results ):
+        
+        # fire-and-forget hint to the os to start pulling these files into the page cache
+        # by the time the serial job loop gets to them, the read is hopefully free
+        
+        if not hasattr( os, 'posix_fadvise' ):
+            
+            return
+            
+        
+        client_files_manager = self._controller.client_files_manager
+        
+        for media_result in media_results:
+            
+            try:
+                
+                path = client_files_manager.GetFilePath( media_result.GetHash(), media_result.GetMime(), check_file_exists = False )
+                
+                fd = os.open( path, os.O_RDONLY )
+                
+                try:
+                    
+                    os.posix_fadvise( fd, 0, 0, os.POSIX_FADV_WILLNEED )
+                    
+                finally:
+                    
+                    os.close( fd )
+                    
+                
+            except:
+                
+                continue
+                
+            
+        
+    
     def _RegenFileMetadata( self, media_result ):
         
         hash = media_result.GetHash()
@@ -1619,9 +2409,22 @@ class FilesMaintenanceManager( object ):
         
         try:
             
-            path = self._controller.client_files_manager.GetFilePath( hash, mime )
+            # the stat will tell us the file is missing anyway, so no need to pay for a separate existence test here
+            
+            path = self._controller.client_files_manager.GetFilePath( hash, mime, check_file_exists = False )
             
-            file_modified_timestamp = HydrusFileHandling.GetFileModifiedTimestamp( path )
+            try:
+                
+                file_modified_timestamp = HydrusFileHandling.GetFileModifiedTimestamp( path )
+                
+            except OSError:
+                
+                # perhaps the file exists with the wrong ext--the slow path will find and fix it, or raise
+                
+                path = self._controller.client_files_manager.GetFilePath( hash, mime )
+                
+                file_modified_timestamp = HydrusFileHandling.GetFileModifiedTimestamp( path )
+                
             
             additional_data = file_modified_timestamp
             
@@ -1643,6 +2446,13 @@ class FilesMaintenanceManager( object ):
             return None
             
         
+        if hash in self._extra_hashes_this_pass:
+            
+            # an integrity check read this file earlier in the pass and hashed everything in one go
+            
+            return self._extra_hashes_this_pass.pop( hash )
+            
+        
         try:
             
             path = self._controller.client_files_manager.GetFilePath( hash, mime )
@@ -1671,6 +2481,13 @@ class FilesMaintenanceManager( object ):
             return None
             
         
+        # the sha256 pins the content, so when this job gets scheduled again in the same pass, the decode and dct need not run twice
+        
+        if hash in self._phashes_this_pass:
+            
+            return self._phashes_this_pass[ hash ]
+            
+        
         try:
             
             path = self._controller.client_files_manager.GetFilePath( hash, mime )
@@ -1682,6 +2499,13 @@ class FilesMaintenanceManager( object ):
         
         phashes = ClientImageHandling.GenerateShapePerceptualHashes( path, mime )
         
+        if len( self._phashes_this_pass ) > 10000:
+            
+            self._phashes_this_pass = {}
+            
+        
+        self._phashes_this_pass[ hash ] = phashes
+        
         return phashes
         
     
@@ -1742,9 +2566,72 @@ class FilesMaintenanceManager( object ):
         self._active_work_rules.AddRule( HC.BANDWIDTH_TYPE_REQUESTS, file_maintenance_active_throttle_time_delta, file_maintenance_active_throttle_files * NORMALISED_BIG_JOB_WEIGHT )
         
     
-    def _RunJob( self, media_results, job_type, job_key, job_done_hook = None ):
+    def _RunForceThumbnailJobs( self, media_results, job_key, job_done_hook = None ):
+        
+        # forced thumbnail regen is embarrassingly parallel, so when a whole batch arrives at once, feed it to the files manager's thread pool in chunks rather than walking it one file at a time
+        
+        try:
+            
+            cleared_jobs = []
+            
+            for media_results_chunk in HydrusData.SplitListIntoChunks( media_results, 25 ):
+                
+                if job_key.IsCancelled():
+                    
+                    return
+                    
+                
+                if job_done_hook is not None:
+                    
+                    for media_result in media_results_chunk:
+                        
+                        job_done_hook( REGENERATE_FILE_DATA_JOB_FORCE_THUMBNAIL )
+                        
+                    
+                
+                try:
+                    
+                    self._controller.client_files_manager.RegenerateThumbnails( media_results_chunk )
+                    
+                except Exception as e:
+                    
+                    HydrusData.PrintException( e )
+                    
+                    message = 'There was a problem performing maintenance task {} on a batch of {} files! The batch will be left in the queue and reattempted later. A full traceback of this error should be written to the log.'.format( regen_file_enum_to_str_lookup[ REGENERATE_FILE_DATA_JOB_FORCE_THUMBNAIL ], HydrusData.ToHumanInt( len( media_results_chunk ) ) )
+                    message += os.linesep * 2
+                    message += str( e )
+                    
+                    HydrusData.ShowText( message )
+                    
+                else:
+                    
+                    # only clear jobs for a batch that actually ran to completion--a batch-level failure means some of these files were never attempted
+                    
+                    cleared_jobs.extend( ( media_result.GetHash(), REGENERATE_FILE_DATA_JOB_FORCE_THUMBNAIL, None ) for media_result in media_results_chunk )
+                    
+                finally:
+                    
+                    self._work_tracker.ReportRequestUsed( num_requests = len( media_results_chunk ) * regen_file_enum_to_job_weight_lookup[ REGENERATE_FILE_DATA_JOB_FORCE_THUMBNAIL ] )
+                    
+                
+                if len( cleared_jobs ) > 100:
+                    
+                    self._DoInteriorClearedJobsFlush( cleared_jobs )
+                    
+                    cleared_jobs = []
+                    
+                
+            
+        finally:
+            
+            if len( cleared_jobs ) > 0:
+                
+                self._controller.Write( 'file_maintenance_clear_jobs', cleared_jobs )
+                
+            
         
-        next_gc_collect = HydrusData.GetNow() + 10
+    
+    def _RunJob( self, media_results, job_type, job_key, job_done_hook = None ):
         
         try:
             
@@ -1757,6 +2644,49 @@ class FilesMaintenanceManager( object ):
                 HydrusData.ShowText( 'file maintenance: {} for {} files'.format( regen_file_enum_to_str_lookup[ job_type ], HydrusData.ToHumanInt( num_to_do ) ) )
                 
             
+            if job_type == REGENERATE_FILE_DATA_JOB_FORCE_THUMBNAIL and num_to_do > 1:
+                
+                self._RunForceThumbnailJobs( media_results, job_key, job_done_hook = job_done_hook )
+                
+                return
+                
+            
+            if job_type == REGENERATE_FILE_DATA_JOB_FILE_MODIFIED_TIMESTAMP and num_to_do > 1:
+                
+                self._RunModifiedTimestampJobs( media_results, job_key, job_done_hook = job_done_hook )
+                
+                return
+                
+            
+            if job_type in PARALLELISABLE_REGEN_JOBS and num_to_do > 1:
+                
+                self._RunParallelisableJobs( media_results, job_type, job_key, job_done_hook = job_done_hook )
+                
+                return
+                
+            
+            # job_type never changes within a call, so pull everything keyed on it out of the loop
+            
+            handler = self._jobs_to_handlers.get( job_type )
+            job_weight = regen_file_enum_to_job_weight_lookup[ job_type ]
+            report_request_used = self._work_tracker.ReportRequestUsed
+            
+            is_refit_job = job_type == REGENERATE_FILE_DATA_JOB_REFIT_THUMBNAIL
+            is_integrity_job = job_type in FILE_INTEGRITY_JOBS
+            
+            if is_refit_job and not job_key.HasVariable( 'num_thumb_refits' ):
+                
+                job_key.SetVariable( 'num_thumb_refits', 0 )
+                
+            
+            if is_integrity_job and not job_key.HasVariable( 'num_bad_files' ):
+                
+                job_key.SetVariable( 'num_bad_files', 0 )
+                
+            
+            num_thumb_refits = job_key.GetIfHasVariable( 'num_thumb_refits' )
+            num_bad_files = job_key.GetIfHasVariable( 'num_bad_files' )
+            
             for ( i, media_result ) in enumerate( media_results ):
                 
                 hash = media_result.GetHash()
@@ -1775,30 +2705,11 @@ class FilesMaintenanceManager( object ):
                 
                 try:
                     
-                    if job_type == REGENERATE_FILE_DATA_JOB_FILE_METADATA:
-                        
-                        additional_data = self._RegenFileMetadata( media_result )
-                        
-                    elif job_type == REGENERATE_FILE_DATA_JOB_FILE_MODIFIED_TIMESTAMP:
-                        
-                        additional_data = self._RegenFileModifiedTimestamp( media_result )
-                        
-                    elif job_type == REGENERATE_FILE_DATA_JOB_OTHER_HASHES:
-                        
-                        additional_data = self._RegenFileOtherHashes( media_result )
-                        
-                    elif job_type == REGENERATE_FILE_DATA_JOB_FORCE_THUMBNAIL:
+                    if handler is not None:
                         
-                        self._RegenFileThumbnailForce( media_result )
+                        additional_data = handler( self, media_result )
                         
-                    elif job_type == REGENERATE_FILE_DATA_JOB_REFIT_THUMBNAIL:
-                        
-                        if not job_key.HasVariable( 'num_thumb_refits' ):
-                            
-                            job_key.SetVariable( 'num_thumb_refits', 0 ) 
-                            
-                        
-                        num_thumb_refits = job_key.GetIfHasVariable( 'num_thumb_refits' )
+                    elif is_refit_job:
                         
                         was_regenerated = self._RegenFileThumbnailRefit( media_result )
                         
@@ -1811,30 +2722,7 @@ class FilesMaintenanceManager( object ):
                         
                         job_key.SetVariable( 'popup_text_2', 'thumbs needing regen: {}'.format( HydrusData.ToHumanInt( num_thumb_refits ) ) )
                         
-                    elif job_type == REGENERATE_FILE_DATA_JOB_DELETE_NEIGHBOUR_DUPES:
-                        
-                        self._DeleteNeighbourDupes( media_result )
-                        
-                    elif job_type == REGENERATE_FILE_DATA_JOB_CHECK_SIMILAR_FILES_MEMBERSHIP:
-                        
-                        additional_data = self._CheckSimilarFilesMembership( media_result )
-                        
-                    elif job_type == REGENERATE_FILE_DATA_JOB_SIMILAR_FILES_METADATA:
-                        
-                        additional_data = self._RegenSimilarFilesMetadata( media_result )
-                        
-                    elif job_type == REGENERATE_FILE_DATA_JOB_FIX_PERMISSIONS:
-                        
-                        self._FixFilePermissions( media_result )
-                        
-                    elif job_type in ( REGENERATE_FILE_DATA_JOB_FILE_INTEGRITY_PRESENCE, REGENERATE_FILE_DATA_JOB_FILE_INTEGRITY_PRESENCE_URL, REGENERATE_FILE_DATA_JOB_FILE_INTEGRITY_DATA, REGENERATE_FILE_DATA_JOB_FILE_INTEGRITY_DATA_URL, REGENERATE_FILE_DATA_JOB_FILE_INTEGRITY_DATA_SILENT_DELETE ):
-                        
-                        if not job_key.HasVariable( 'num_bad_files' ):
-                            
-                            job_key.SetVariable( 'num_bad_files', 0 ) 
-                            
-                        
-                        num_bad_files = job_key.GetIfHasVariable( 'num_bad_files' )
+                    elif is_integrity_job:
                         
                         file_was_bad = self._CheckFileIntegrity( media_result, job_type )
                         
@@ -1860,7 +2748,7 @@ class FilesMaintenanceManager( object ):
                     
                 finally:
                     
-                    self._work_tracker.ReportRequestUsed( num_requests = regen_file_enum_to_job_weight_lookup[ job_type ] )
+                    report_request_used( num_requests = job_weight )
                     
                     cleared_jobs.append( ( hash, job_type, additional_data ) )
                     
@@ -1876,7 +2764,77 @@ class FilesMaintenanceManager( object ):
                 
                 if len( cleared_jobs ) > 100:
                     
-                    self._controller.WriteSynchronous( 'file_maintenance_clear_jobs', cleared_jobs )
+                    self._DoInteriorClearedJobsFlush( cleared_jobs )
+                    
+                    cleared_jobs = []
+                    
+                
+            
+        finally:
+            
+            self._FlushAllURLsBuffer()
+            
+            if len( cleared_jobs ) > 0:
+                
+                self._controller.Write( 'file_maintenance_clear_jobs', cleared_jobs )
+                
+            
+        
+    
+    def _RunModifiedTimestampJobs( self, media_results, job_key, job_done_hook = None ):
+        
+        # one scandir per prefix directory answers a whole group's mtimes, rather than a path build and stat per file
+        
+        cleared_jobs = []
+        
+        try:
+            
+            for media_results_chunk in HydrusData.SplitListIntoChunks( media_results, 100 ):
+                
+                if job_key.IsCancelled():
+                    
+                    return
+                    
+                
+                eligible_media_results = [ media_result for media_result in media_results_chunk if media_result.GetMime() not in HC.HYDRUS_UPDATE_FILES ]
+                
+                try:
+                    
+                    hashes_to_timestamps = self._controller.client_files_manager.GetFileModifiedTimestamps( eligible_media_results )
+                    
+                except Exception as e:
+                    
+                    HydrusData.PrintException( e )
+                    
+                    hashes_to_timestamps = {}
+                    
+                
+                for media_result in media_results_chunk:
+                    
+                    if job_done_hook is not None:
+                        
+                        job_done_hook( REGENERATE_FILE_DATA_JOB_FILE_MODIFIED_TIMESTAMP )
+                        
+                    
+                    hash = media_result.GetHash()
+                    
+                    additional_data = hashes_to_timestamps.get( hash )
+                    
+                    if additional_data is None and media_result.GetMime() not in HC.HYDRUS_UPDATE_FILES:
+                        
+                        # maybe it exists with the wrong ext--the per-file path will find and fix it, or write the job off
+                        
+                        additional_data = self._RegenFileModifiedTimestamp( media_result )
+                        
+                    
+                    self._work_tracker.ReportRequestUsed( num_requests = regen_file_enum_to_job_weight_lookup[ REGENERATE_FILE_DATA_JOB_FILE_MODIFIED_TIMESTAMP ] )
+                    
+                    cleared_jobs.append( ( hash, REGENERATE_FILE_DATA_JOB_FILE_MODIFIED_TIMESTAMP, additional_data ) )
+                    
+                
+                if len( cleared_jobs ) > 100:
+                    
+                    self._DoInteriorClearedJobsFlush( cleared_jobs )
                     
                     cleared_jobs = []
                     
@@ -1891,6 +2849,92 @@ class FilesMaintenanceManager( object ):
             
         
     
+    def _RunParallelisableJobs( self, media_results, job_type, job_key, job_done_hook = None ):
+        
+        # hashing and decoding do their heavy lifting outside the GIL, so a pool of workers gets real multi-core scaling here
+        # db flushes, work accounting and progress reporting all stay on this thread as the futures complete
+        
+        handler = self._jobs_to_handlers[ job_type ]
+        
+        num_workers = os.cpu_count() or 1
+        
+        cleared_jobs = []
+        
+        try:
+            
+            with concurrent.futures.ThreadPoolExecutor( max_workers = num_workers ) as executor:
+                
+                for media_results_chunk in HydrusData.SplitListIntoChunks( media_results, 32 ):
+                    
+                    if job_key.IsCancelled():
+                        
+                        return
+                        
+                    
+                    futures_to_hashes = { executor.submit( handler, self, media_result ) : media_result.GetHash() for media_result in media_results_chunk }
+                    
+                    for future in concurrent.futures.as_completed( futures_to_hashes ):
+                        
+                        hash = futures_to_hashes[ future ]
+                        
+                        if job_done_hook is not None:
+                            
+                            job_done_hook( job_type )
+                            
+                        
+                        additional_data = None
+                        
+                        try:
+                            
+                            additional_data = future.result()
+                            
+                        except Exception as e:
+                            
+                            HydrusData.PrintException( e )
+                            
+                            message = 'There was a problem performing maintenance task {} on file {}! The job will not be reattempted. A full traceback of this error should be written to the log.'.format( regen_file_enum_to_str_lookup[ job_type ], hash.hex() )
+                            message += os.linesep * 2
+                            message += str( e )
+                            
+                            HydrusData.ShowText( message )
+                            
+                        finally:
+                            
+                            self._work_tracker.ReportRequestUsed( num_requests = regen_file_enum_to_job_weight_lookup[ job_type ] )
+                            
+                            cleared_jobs.append( ( hash, job_type, additional_data ) )
+                            
+                        
+                        if len( cleared_jobs ) > 100:
+                            
+                            self._DoInteriorClearedJobsFlush( cleared_jobs )
+                            
+                            cleared_jobs = []
+                            
+                        
+                    
+                    self._jobs_since_last_gc_collect += len( media_results_chunk )
+                    
+                    if self._jobs_since_last_gc_collect > 100:
+                        
+                        gc.collect()
+                        
+                        self._jobs_since_last_gc_collect = 0
+                        
+                    
+                
+            
+        finally:
+            
+            self._FlushAllURLsBuffer()
+            
+            if len( cleared_jobs ) > 0:
+                
+                self._controller.Write( 'file_maintenance_clear_jobs', cleared_jobs )
+                
+            
+        
+    
     def CancelJobs( self, job_type ):
         
         with self._lock:
@@ -1945,6 +2989,11 @@ class FilesMaintenanceManager( object ):
         
         with self._maintenance_lock:
             
+            self._known_missing_this_pass = set()
+            self._extra_hashes_this_pass = {}
+            self._phashes_this_pass = {}
+            self._url_classes_this_pass = {}
+            
             try:
                 
                 while True:
@@ -1974,9 +3023,9 @@ class FilesMaintenanceManager( object ):
                     
                     media_results = self._controller.Read( 'media_results', hashes )
                     
-                    hashes_to_media_results = { media_result.GetHash() : media_result for media_result in media_results }
+                    present_hashes = { media_result.GetHash() for media_result in media_results }
                     
-                    missing_hashes = [ hash for hash in hashes if hash not in hashes_to_media_results ]
+                    missing_hashes = [ hash for hash in hashes if hash not in present_hashes ]
                     
                     self._ClearJobs( missing_hashes, job_type )
                     
@@ -1985,8 +3034,6 @@ class FilesMaintenanceManager( object ):
                         self._RunJob( media_results, job_type, job_key, job_done_hook = job_done_hook )
                         
                     
-                    time.sleep( 0.0001 )
-                    
                 
             finally:
                 
@@ -2012,7 +3059,7 @@ class FilesMaintenanceManager( object ):
         
         def check_shutdown():
             
-            if HydrusThreading.IsThreadShuttingDown() or self._shutdown:
+            if HydrusThreading.IsThreadShuttingDown() or self._shutdown_event.is_set():
                 
                 raise HydrusExceptions.ShutdownException()
                 
@@ -2029,7 +3076,9 @@ class FilesMaintenanceManager( object ):
                     break
                     
                 
-                time.sleep( 1 )
+                # an event wait instead of a sleep so shutdown and reset can wake us immediately
+                
+                self._shutdown_event.wait( 1 )
                 
             
         
@@ -2049,14 +3098,9 @@ class FilesMaintenanceManager( object ):
         
         try:
             
-            time_to_start = HydrusData.GetNow() + 15
+            self._shutdown_event.wait( 15 )
             
-            while not HydrusData.TimeHasPassed( time_to_start ):
-                
-                check_shutdown()
-                
-                time.sleep( 1 )
-                
+            check_shutdown()
             
             while True:
                 
@@ -2074,7 +3118,7 @@ class FilesMaintenanceManager( object ):
                         
                         job_key = ClientThreading.JobKey()
                         
-                        i = 0
+                        next_pub_time = HydrusData.GetNowPrecise() + 0.5
                         
                         try:
                             
@@ -2082,13 +3126,39 @@ class FilesMaintenanceManager( object ):
                             
                             media_results = self._controller.Read( 'media_results', hashes )
                             
-                            hashes_to_media_results = { media_result.GetHash() : media_result for media_result in media_results }
+                            present_hashes = { media_result.GetHash() for media_result in media_results }
                             
-                            missing_hashes = [ hash for hash in hashes if hash not in hashes_to_media_results ]
+                            missing_hashes = [ hash for hash in hashes if hash not in present_hashes ]
                             
                             self._ClearJobs( missing_hashes, job_type )
                             
-                            for media_result in media_results:
+                            if job_type in PARALLELISABLE_REGEN_JOBS:
+                                
+                                # these jobs have a thread-pool runner, so feed it decent chunks and let the lock, wait and reset checks fire once per chunk rather than once per file
+                                
+                                media_result_groups = HydrusData.SplitListIntoChunks( media_results, 16 )
+                                
+                            else:
+                                
+                                media_result_groups = ( ( media_result, ) for media_result in media_results )
+                                
+                            
+                            group_iterator = iter( media_result_groups )
+                            
+                            next_media_result_group = next( group_iterator, None )
+                            
+                            while next_media_result_group is not None:
+                                
+                                media_result_group = next_media_result_group
+                                
+                                next_media_result_group = next( group_iterator, None )
+                                
+                                if next_media_result_group is not None:
+                                    
+                                    # warm the next group's file bytes while we work on this one, overlapping disk and cpu
+                                    
+                                    self._controller.CallToThread( self._PrefetchMediaResultFiles, next_media_result_group )
+                                    
                                 
                                 wait_on_maintenance()
                                 
@@ -2099,17 +3169,15 @@ class FilesMaintenanceManager( object ):
                                 
                                 with self._lock:
                                     
-                                    self._RunJob( ( media_result, ), job_type, job_key )
+                                    self._RunJob( media_result_group, job_type, job_key )
                                     
                                 
-                                time.sleep( 0.0001 )
-                                
-                                i += 1
-                                
-                                if i % 100 == 0:
+                                if HydrusData.GetNowPrecise() > next_pub_time:
                                     
                                     self._controller.pub( 'notify_files_maintenance_done' )
                                     
+                                    next_pub_time = HydrusData.GetNowPrecise() + 0.5
+                                    
                                 
                             
                         finally:
@@ -2121,6 +3189,11 @@ class FilesMaintenanceManager( object ):
                 
                 if not did_work:
                     
+                    self._known_missing_this_pass = set()
+                    self._extra_hashes_this_pass = {}
+                    self._phashes_this_pass = {}
+                    self._url_classes_this_pass = {}
+                    
                     self._wake_background_event.wait( 600 )
                     
                     self._wake_background_event.clear()
@@ -2139,6 +3212,11 @@ class FilesMaintenanceManager( object ):
         
         with self._lock:
             
+            self._known_missing_this_pass = set()
+            self._extra_hashes_this_pass = {}
+            self._phashes_this_pass = {}
+            self._url_classes_this_pass = {}
+            
             self._ReInitialiseWorkRules()
             
         
@@ -2219,7 +3297,7 @@ class FilesMaintenanceManager( object ):
     
     def Shutdown( self ):
         
-        self._shutdown = True
+        self._shutdown_event.set()
         
         self._wake_background_event.set()
         
@@ -2228,3 +3306,18 @@ class FilesMaintenanceManager( object ):
         
         self._controller.CallToThreadLongRunning( self.MainLoopBackgroundWork )
         
+    
+    # one dict lookup beats walking a ladder of == comparisons for every media result
+    # the stateful types--refit thumbnails and the integrity checks--keep their explicit branches in _RunJob for their job_key counters
+    
+    _jobs_to_handlers = {
+        REGENERATE_FILE_DATA_JOB_FILE_METADATA : _RegenFileMetadata,
+        REGENERATE_FILE_DATA_JOB_FILE_MODIFIED_TIMESTAMP : _RegenFileModifiedTimestamp,
+        REGENERATE_FILE_DATA_JOB_OTHER_HASHES : _RegenFileOtherHashes,
+        REGENERATE_FILE_DATA_JOB_FORCE_THUMBNAIL : _RegenFileThumbnailForce,
+        REGENERATE_FILE_DATA_JOB_DELETE_NEIGHBOUR_DUPES : _DeleteNeighbourDupes,
+        REGENERATE_FILE_DATA_JOB_CHECK_SIMILAR_FILES_MEMBERSHIP : _CheckSimilarFilesMembership,
+        REGENERATE_FILE_DATA_JOB_SIMILAR_FILES_METADATA : _RegenSimilarFilesMetadata,
+        REGENERATE_FILE_DATA_JOB_FIX_PERMISSIONS : _FixFilePermissions
+    }
+        
@@ -1,11 +1,10 @@
-from functools import reduce
-
 import numpy
 import numpy.core.multiarray # important this comes before cv!
 
 import cv2
 
 from hydrus.client import ClientConstants as CC
+from hydrus.core import HydrusConstants as HC
 from hydrus.core import HydrusData
 from hydrus.core import HydrusImageHandling
 from hydrus.core import HydrusGlobals as HG
@@ -37,57 +36,72 @@ def GenerateShapePerceptualHashes( path, mime ):
         HydrusData.ShowText( 'phash generation: loading image' )
         
     
-    numpy_image = GenerateNumPyImage( path, mime )
+    numpy_image_gray = None
     
-    if HG.phash_generation_report_mode:
+    if mime == HC.IMAGE_JPEG and HydrusImageHandling.OPENCV_OK and not HG.client_controller.new_options.GetBoolean( 'load_images_with_pil' ):
         
-        HydrusData.ShowText( 'phash generation: image shape: {}'.format( numpy_image.shape ) )
+        # jpegs cannot carry alpha and we only want luma here, so let opencv decode straight to greyscale and skip the full rgb round-trip
+        # IMREAD_GRAYSCALE still applies EXIF reorientation
         
-    
-    ( y, x, depth ) = numpy_image.shape
-    
-    if depth == 4:
+        numpy_image_gray = cv2.imread( path, flags = cv2.IMREAD_GRAYSCALE )
         
-        # doing this on 10000x10000 pngs eats ram like mad
-        # we don't want to do GetThumbnailResolution as for extremely wide or tall images, we'll then scale below 32 pixels for one dimension, losing information!
-        # however, it does not matter if we stretch the image a bit, since we'll be coercing 32x32 in a minute
+    
+    if numpy_image_gray is None:
         
-        new_x = min( 256, x )
-        new_y = min( 256, y )
+        numpy_image = GenerateNumPyImage( path, mime )
         
-        numpy_image = cv2.resize( numpy_image, ( new_x, new_y ), interpolation = cv2.INTER_AREA )
+        if HG.phash_generation_report_mode:
+            
+            HydrusData.ShowText( 'phash generation: image shape: {}'.format( numpy_image.shape ) )
+            
         
         ( y, x, depth ) = numpy_image.shape
         
-        # create weight and transform numpy_image to greyscale
-        
-        numpy_alpha = numpy_image[ :, :, 3 ]
-        
-        numpy_image_rgb = numpy_image[ :, :, :3 ]
-        
-        numpy_image_gray_bare = cv2.cvtColor( numpy_image_rgb, cv2.COLOR_RGB2GRAY )
-        
-        # create a white greyscale canvas
-        
-        white = numpy.full( ( y, x ), 255.0 )
-        
-        # paste the grayscale image onto the white canvas using: pixel * alpha_float + white * ( 1 - alpha_float )
-        
-        # note alpha 255 = opaque, alpha 0 = transparent
-        
-        # also, note:
-        # white * ( 1 - alpha_float )
-        # =
-        # 255 * ( 1 - ( alpha / 255 ) )
-        # =
-        # 255 - alpha
-        
-        numpy_image_gray = numpy.uint8( ( numpy_image_gray_bare * ( numpy_alpha / 255.0 ) ) + ( white - numpy_alpha ) )
-        
-    else:
-        
-        # this single step is nice and fast, so we won't scale to 256x256 beforehand
-        numpy_image_gray = cv2.cvtColor( numpy_image, cv2.COLOR_RGB2GRAY )
+        if depth == 4:
+            
+            # doing this on 10000x10000 pngs eats ram like mad
+            # we don't want to do GetThumbnailResolution as for extremely wide or tall images, we'll then scale below 32 pixels for one dimension, losing information!
+            # however, it does not matter if we stretch the image a bit, since we'll be coercing 32x32 in a minute
+            
+            new_x = min( 256, x )
+            new_y = min( 256, y )
+            
+            numpy_image = cv2.resize( numpy_image, ( new_x, new_y ), interpolation = cv2.INTER_AREA )
+            
+            ( y, x, depth ) = numpy_image.shape
+            
+            # create weight and transform numpy_image to greyscale
+            
+            numpy_alpha = numpy_image[ :, :, 3 ]
+            
+            numpy_image_rgb = numpy_image[ :, :, :3 ]
+            
+            numpy_image_gray_bare = cv2.cvtColor( numpy_image_rgb, cv2.COLOR_RGB2GRAY )
+            
+            # create a white greyscale canvas
+            
+            white = numpy.full( ( y, x ), 255.0, dtype = numpy.float32 )
+            
+            # paste the grayscale image onto the white canvas using: pixel * alpha_float + white * ( 1 - alpha_float )
+            
+            # note alpha 255 = opaque, alpha 0 = transparent
+            
+            # also, note:
+            # white * ( 1 - alpha_float )
+            # =
+            # 255 * ( 1 - ( alpha / 255 ) )
+            # =
+            # 255 - alpha
+            
+            numpy_alpha_float = numpy_alpha.astype( numpy.float32 ) / 255.0
+            
+            numpy_image_gray = numpy.uint8( ( numpy_image_gray_bare * numpy_alpha_float ) + ( white - numpy_alpha ) )
+            
+        else:
+            
+            # this single step is nice and fast, so we won't scale to 256x256 beforehand
+            numpy_image_gray = cv2.cvtColor( numpy_image, cv2.COLOR_RGB2GRAY )
+            
         
     
     if HG.phash_generation_report_mode:
@@ -143,42 +157,9 @@ def GenerateShapePerceptualHashes( path, mime ):
         HydrusData.ShowText( 'phash generation: collapsing bytes' )
         
     
-    # convert TTTFTFTF to 11101010 by repeatedly shifting answer and adding 0 or 1
-    # you can even go ( a << 1 ) + b and leave out the initial param on the reduce call as bools act like ints for this
-    # but let's not go crazy for another two nanoseconds
-    def collapse_bools_to_binary_uint( a, b ):
-        
-        return ( a << 1 ) + int( b )
-        
-    
-    list_of_bytes = []
-    
-    for i in range( 8 ):
-        
-        '''
-        # old way of doing it, which compared value to median every time
-        byte = 0
-        
-        for j in range( 8 ):
-            
-            byte <<= 1 # shift byte one left
-            
-            value = dct_88[i,j]
-            
-            if value > median:
-                
-                byte |= 1
-                
-            
-        '''
-        
-        # this is a 0-255 int
-        byte = reduce( collapse_bools_to_binary_uint, dct_88_boolean[i], 0 )
-        
-        list_of_bytes.append( byte )
-        
-    
-    phash = bytes( list_of_bytes ) # this works!
+    # convert TTTFTFTF to 11101010
+    # packbits is MSB-first and row-major, so this is bit-for-bit what the old shift-and-add reduce loop produced, just done in C
+    phash = numpy.packbits( dct_88_boolean ).tobytes()
     
     if HG.phash_generation_report_mode:
         
@@ -648,6 +648,43 @@ class DB( HydrusDB.HydrusDB ):
             
         
     
+    def _AreOrphans( self, test_type, possible_hashes ):
+        
+        # the orphan clearer used to ask about every file in a separate read call--this filters a whole batch in one query
+        
+        orphan_hashes = set()
+        
+        hashes_to_hash_ids = {}
+        
+        for possible_hash in possible_hashes:
+            
+            if self._HashExists( possible_hash ):
+                
+                hashes_to_hash_ids[ possible_hash ] = self.modules_hashes_local_cache.GetHashId( possible_hash )
+                
+            else:
+                
+                orphan_hashes.add( possible_hash )
+                
+            
+        
+        if len( hashes_to_hash_ids ) > 0:
+            
+            if test_type == 'file':
+                
+                useful_hash_ids = self.modules_files_storage.FilterCurrentHashIds( self.modules_services.combined_local_file_service_id, set( hashes_to_hash_ids.values() ) )
+                
+            elif test_type == 'thumbnail':
+                
+                useful_hash_ids = self.modules_files_storage.FilterAllCurrentHashIds( set( hashes_to_hash_ids.values() ) )
+                
+            
+            orphan_hashes.update( ( hash for ( hash, hash_id ) in hashes_to_hash_ids.items() if hash_id not in useful_hash_ids ) )
+            
+        
+        return orphan_hashes
+        
+    
     def _Backup( self, path ):
         
         self._CloseDBConnection()
@@ -13010,6 +13047,7 @@ class DB( HydrusDB.HydrusDB ):
     def _Read( self, action, *args, **kwargs ):
         
         if action == 'autocomplete_predicates': result = self._GetAutocompletePredicates( *args, **kwargs )
+        elif action == 'are_orphans': result = self._AreOrphans( *args, **kwargs )
         elif action == 'boned_stats': result = self._GetBonedStats( *args, **kwargs )
         elif action == 'client_files_locations': result = self._GetClientFilesLocations( *args, **kwargs )
         elif action == 'duplicate_pairs_for_filtering': result = self._DuplicatesGetPotentialDuplicatePairsForFiltering( *args, **kwargs )
@@ -1,6 +1,8 @@
+import collections
 import sqlite3
 import typing
 
+from hydrus.core import HydrusData
 from hydrus.core import HydrusDB
 from hydrus.core import HydrusDBModule
 from hydrus.core import HydrusExceptions
@@ -8,13 +10,15 @@ from hydrus.core import HydrusTags
 
 from hydrus.client.db import ClientDBMaster
 
+MAX_DEFINITION_CACHE_SIZE = 100000
+
 class ClientDBCacheLocalHashes( HydrusDBModule.HydrusDBModule ):
     
     def __init__( self, cursor: sqlite3.Cursor, modules_hashes: ClientDBMaster.ClientDBMasterHashes ):
         
         self.modules_hashes = modules_hashes
         
-        self._hash_ids_to_hashes_cache = {}
+        self._hash_ids_to_hashes_cache = collections.OrderedDict()
         
         HydrusDBModule.HydrusDBModule.__init__( self, 'client hashes local cache', cursor )
         
@@ -28,17 +32,33 @@ class ClientDBCacheLocalHashes( HydrusDBModule.HydrusDBModule ):
     
     def _PopulateHashIdsToHashesCache( self, hash_ids ):
         
-        if len( self._hash_ids_to_hashes_cache ) > 100000:
+        cache = self._hash_ids_to_hashes_cache
+        
+        uncached_hash_ids = set()
+        
+        num_in_this_request = 0
+        
+        for hash_id in hash_ids:
+            
+            num_in_this_request += 1
             
-            if not isinstance( hash_ids, set ):
+            if hash_id in cache:
                 
-                hash_ids = set( hash_ids )
+                cache.move_to_end( hash_id )
+                
+            else:
+                
+                uncached_hash_ids.add( hash_id )
                 
-            
-            self._hash_ids_to_hashes_cache = { hash_id : hash for ( hash_id, hash ) in self._hash_ids_to_hashes_cache.items() if hash_id in hash_ids }
             
         
-        uncached_hash_ids = { hash_id for hash_id in hash_ids if hash_id not in self._hash_ids_to_hashes_cache }
+        
+        if len( uncached_hash_ids ) == 0:
+            
+            # the common ui-refresh case--everything is already cached, so skip the fetch and eviction machinery
+            
+            return
+            
         
         if len( uncached_hash_ids ) > 0:
             
@@ -70,6 +90,16 @@ class ClientDBCacheLocalHashes( HydrusDBModule.HydrusDBModule ):
             self._hash_ids_to_hashes_cache.update( hash_ids_to_hashes )
             
         
+        # evict oldest-touched entries, which beats the old 'throw away everything not in this request' approach for hot ids
+        # never evict below the size of the current request, though--the caller is about to read every one of these back
+        
+        size_cap = max( MAX_DEFINITION_CACHE_SIZE, num_in_this_request )
+        
+        while len( self._hash_ids_to_hashes_cache ) > size_cap:
+            
+            self._hash_ids_to_hashes_cache.popitem( last = False )
+            
+        
     
     def CreateInitialTables( self ):
         
@@ -80,7 +110,7 @@ class ClientDBCacheLocalHashes( HydrusDBModule.HydrusDBModule ):
         
         hash_ids_to_hashes = self.modules_hashes.GetHashIdsToHashes( hash_ids = hash_ids )
         
-        self._ExecuteMany( 'INSERT OR IGNORE INTO local_hashes_cache ( hash_id, hash ) VALUES ( ?, ? );', ( ( hash_id, sqlite3.Binary( hash ) ) for ( hash_id, hash ) in hash_ids_to_hashes.items() ) )
+        self._ExecuteMany( 'INSERT OR IGNORE INTO local_hashes_cache ( hash_id, hash ) VALUES ( ?, ? );', hash_ids_to_hashes.items() )
         
     
     def ClearCache( self ):
@@ -90,7 +120,16 @@ class ClientDBCacheLocalHashes( HydrusDBModule.HydrusDBModule ):
     
     def DropHashIdsFromCache( self, hash_ids ):
         
-        self._ExecuteMany( 'DELETE FROM local_hashes_cache WHERE hash_id = ?;', ( ( hash_id, ) for hash_id in hash_ids ) )
+        with self._MakeTemporaryIntegerTable( hash_ids, 'hash_id' ) as temp_table_name:
+            
+            # one delete over the whole batch, rather than a statement per id
+            self._Execute( 'DELETE FROM local_hashes_cache WHERE hash_id IN ( SELECT hash_id FROM {} );'.format( temp_table_name ) )
+            
+        
+        for hash_id in hash_ids:
+            
+            self._hash_ids_to_hashes_cache.pop( hash_id, None )
+            
         
     
     def GetExpectedTableNames( self ) -> typing.Collection[ str ]:
@@ -104,21 +143,34 @@ class ClientDBCacheLocalHashes( HydrusDBModule.HydrusDBModule ):
     
     def GetHash( self, hash_id ) -> str:
         
+        # single-id fetches are the ui's bread and butter, so skip the populate machinery on a hit
+        
+        cache = self._hash_ids_to_hashes_cache
+        
+        if hash_id in cache:
+            
+            cache.move_to_end( hash_id )
+            
+            return cache[ hash_id ]
+            
+        
         self._PopulateHashIdsToHashesCache( ( hash_id, ) )
         
-        return self._hash_ids_to_hashes_cache[ hash_id ]
+        return cache[ hash_id ]
         
     
     def GetHashes( self, hash_ids ) -> typing.List[ bytes ]:
         
         self._PopulateHashIdsToHashesCache( hash_ids )
         
-        return [ self._hash_ids_to_hashes_cache[ hash_id ] for hash_id in hash_ids ]
+        cache = self._hash_ids_to_hashes_cache
+        
+        return [ cache[ hash_id ] for hash_id in hash_ids ]
         
     
     def GetHashId( self, hash ) -> int:
         
-        result = self._Execute( 'SELECT hash_id FROM local_hashes_cache WHERE hash = ?;', ( sqlite3.Binary( hash ), ) ).fetchone()
+        result = self._Execute( 'SELECT hash_id FROM local_hashes_cache WHERE hash = ?;', ( hash, ) ).fetchone()
         
         if result is None:
             
@@ -135,27 +187,21 @@ class ClientDBCacheLocalHashes( HydrusDBModule.HydrusDBModule ):
     def GetHashIds( self, hashes ) -> typing.Set[ int ]:
         
         hash_ids = set()
-        hashes_not_in_cache = set()
         
-        for hash in hashes:
-            
-            if hash is None:
-                
-                continue
-                
+        hashes_not_in_cache = { hash for hash in hashes if hash is not None }
+        
+        # one select per chunk, rather than a statement and fetchone per hash
+        
+        for chunk_of_hashes in HydrusData.SplitListIntoChunks( list( hashes_not_in_cache ), 256 ):
             
-            result = self._Execute( 'SELECT hash_id FROM local_hashes_cache WHERE hash = ?;', ( sqlite3.Binary( hash ), ) ).fetchone()
+            select_statement = 'SELECT hash, hash_id FROM local_hashes_cache WHERE hash IN ( {} );'.format( ', '.join( '?' * len( chunk_of_hashes ) ) )
             
-            if result is None:
-                
-                hashes_not_in_cache.add( hash )
-                
-            else:
-                
-                ( hash_id, ) = result
+            for ( hash, hash_id ) in self._Execute( select_statement, chunk_of_hashes ):
                 
                 hash_ids.add( hash_id )
                 
+                hashes_not_in_cache.discard( hash )
+                
             
         
         if len( hashes_not_in_cache ) > 0:
@@ -172,7 +218,9 @@ class ClientDBCacheLocalHashes( HydrusDBModule.HydrusDBModule ):
             
             self._PopulateHashIdsToHashesCache( hash_ids )
             
-            hash_ids_to_hashes = { hash_id : self._hash_ids_to_hashes_cache[ hash_id ] for hash_id in hash_ids }
+            cache = self._hash_ids_to_hashes_cache
+            
+            hash_ids_to_hashes = { hash_id : cache[ hash_id ] for hash_id in hash_ids }
             
         elif hashes is not None:
             
@@ -196,13 +244,23 @@ class ClientDBCacheLocalHashes( HydrusDBModule.HydrusDBModule ):
         return result is not None
         
     
+    def HasHashIds( self, hash_ids ) -> typing.Set[ int ]:
+        
+        # existence testing a whole batch in one statement--prefer this over calling HasHashId in a loop
+        
+        with self._MakeTemporaryIntegerTable( hash_ids, 'hash_id' ) as temp_table_name:
+            
+            return self._STS( self._Execute( 'SELECT hash_id FROM {} CROSS JOIN local_hashes_cache USING ( hash_id );'.format( temp_table_name ) ) )
+            
+        
+    
 class ClientDBCacheLocalTags( HydrusDBModule.HydrusDBModule ):
     
     def __init__( self, cursor: sqlite3.Cursor, modules_tags: ClientDBMaster.ClientDBMasterTags ):
         
         self.modules_tags = modules_tags
         
-        self._tag_ids_to_tags_cache = {}
+        self._tag_ids_to_tags_cache = collections.OrderedDict()
         
         HydrusDBModule.HydrusDBModule.__init__( self, 'client tags local cache', cursor )
         
@@ -216,17 +274,33 @@ class ClientDBCacheLocalTags( HydrusDBModule.HydrusDBModule ):
     
     def _PopulateTagIdsToTagsCache( self, tag_ids ):
         
-        if len( self._tag_ids_to_tags_cache ) > 100000:
+        cache = self._tag_ids_to_tags_cache
+        
+        uncached_tag_ids = set()
+        
+        num_in_this_request = 0
+        
+        for tag_id in tag_ids:
+            
+            num_in_this_request += 1
             
-            if not isinstance( tag_ids, set ):
+            if tag_id in cache:
                 
-                tag_ids = set( tag_ids )
+                cache.move_to_end( tag_id )
+                
+            else:
+                
+                uncached_tag_ids.add( tag_id )
                 
-            
-            self._tag_ids_to_tags_cache = { tag_id : tag for ( tag_id, tag ) in self._tag_ids_to_tags_cache.items() if tag_id in tag_ids }
             
         
-        uncached_tag_ids = { tag_id for tag_id in tag_ids if tag_id not in self._tag_ids_to_tags_cache }
+        
+        if len( uncached_tag_ids ) == 0:
+            
+            # the common ui-refresh case--everything is already cached, so skip the fetch and eviction machinery
+            
+            return
+            
         
         if len( uncached_tag_ids ) > 0:
             
@@ -258,6 +332,16 @@ class ClientDBCacheLocalTags( HydrusDBModule.HydrusDBModule ):
             self._tag_ids_to_tags_cache.update( tag_ids_to_tags )
             
         
+        # evict oldest-touched entries, which beats the old 'throw away everything not in this request' approach for hot ids
+        # never evict below the size of the current request, though--the caller is about to read every one of these back
+        
+        size_cap = max( MAX_DEFINITION_CACHE_SIZE, num_in_this_request )
+        
+        while len( self._tag_ids_to_tags_cache ) > size_cap:
+            
+            self._tag_ids_to_tags_cache.popitem( last = False )
+            
+        
     
     def CreateInitialTables( self ):
         
@@ -278,7 +362,16 @@ class ClientDBCacheLocalTags( HydrusDBModule.HydrusDBModule ):
     
     def DropTagIdsFromCache( self, tag_ids ):
         
-        self._ExecuteMany( 'DELETE FROM local_tags_cache WHERE tag_id = ?;', ( ( tag_id, ) for tag_id in tag_ids ) )
+        with self._MakeTemporaryIntegerTable( tag_ids, 'tag_id' ) as temp_table_name:
+            
+            # one delete over the whole batch, rather than a statement per id
+            self._Execute( 'DELETE FROM local_tags_cache WHERE tag_id IN ( SELECT tag_id FROM {} );'.format( temp_table_name ) )
+            
+        
+        for tag_id in tag_ids:
+            
+            self._tag_ids_to_tags_cache.pop( tag_id, None )
+            
         
     
     def GetExpectedTableNames( self ) -> typing.Collection[ str ]:
@@ -299,9 +392,20 @@ class ClientDBCacheLocalTags( HydrusDBModule.HydrusDBModule ):
     
     def GetTag( self, tag_id ) -> str:
         
+        # single-id fetches are the ui's bread and butter, so skip the populate machinery on a hit
+        
+        cache = self._tag_ids_to_tags_cache
+        
+        if tag_id in cache:
+            
+            cache.move_to_end( tag_id )
+            
+            return cache[ tag_id ]
+            
+        
         self._PopulateTagIdsToTagsCache( ( tag_id, ) )
         
-        return self._tag_ids_to_tags_cache[ tag_id ]
+        return cache[ tag_id ]
         
     
     def GetTagId( self, tag ) -> int:
@@ -337,7 +441,9 @@ class ClientDBCacheLocalTags( HydrusDBModule.HydrusDBModule ):
             
             self._PopulateTagIdsToTagsCache( tag_ids )
             
-            tag_ids_to_tags = { tag_id : self._tag_ids_to_tags_cache[ tag_id ] for tag_id in tag_ids }
+            cache = self._tag_ids_to_tags_cache
+            
+            tag_ids_to_tags = { tag_id : cache[ tag_id ] for tag_id in tag_ids }
             
         elif tags is not None:
             
@@ -81,6 +81,8 @@ class ClientDBFilesMaintenance( HydrusDBModule.HydrusDBModule ):
         
         new_file_info = set()
         
+        deletee_job_rows = []
+        
         for ( hash, job_type, additional_data ) in cleared_job_tuples:
             
             hash_id = self.modules_hashes_local_cache.GetHashId( hash )
@@ -170,9 +172,13 @@ class ClientDBFilesMaintenance( HydrusDBModule.HydrusDBModule ):
             
             job_types_to_delete.extend( ClientFiles.regen_file_enum_to_overruled_jobs[ job_type ] )
             
-            self._ExecuteMany( 'DELETE FROM file_maintenance_jobs WHERE hash_id = ? AND job_type = ?;', ( ( hash_id, job_type_to_delete ) for job_type_to_delete in job_types_to_delete ) )
+            deletee_job_rows.extend( ( ( hash_id, job_type_to_delete ) for job_type_to_delete in job_types_to_delete ) )
             
         
+        # one executemany over the whole batch beats a separate call per file
+        
+        self._ExecuteMany( 'DELETE FROM file_maintenance_jobs WHERE hash_id = ? AND job_type = ?;', deletee_job_rows )
+        
         if len( new_file_info ) > 0:
             
             hashes_that_need_refresh = set()
@@ -2514,7 +2514,7 @@ class ReviewFileMaintenance( ClientGUIScrolledPanels.ReviewPanel ):
         
         job_type = self._action_selector.GetValue()
         
-        message = ClientFiles.regen_file_enum_to_description_lookup[ job_type ]
+        message = ClientFiles.GetRegenFileEnumDescription( job_type )
         message += os.linesep * 2
         message += 'This job has weight {}, where a normalised unit of file work has value {}.'.format( HydrusData.ToHumanInt( ClientFiles.regen_file_enum_to_job_weight_lookup[ job_type ] ), HydrusData.ToHumanInt( ClientFiles.NORMALISED_BIG_JOB_WEIGHT ) )
         
@@ -69,9 +69,9 @@ class NetworkBandwidthManager( HydrusSerialisable.SerialisableBase ):
         
         self._lock = threading.Lock()
         
-        self._last_pages_gallery_query_timestamps = collections.defaultdict( lambda: 0 )
-        self._last_subscriptions_gallery_query_timestamps = collections.defaultdict( lambda: 0 )
-        self._last_watchers_query_timestamps = collections.defaultdict( lambda: 0 )
+        self._last_pages_gallery_query_timestamps = collections.defaultdict( int )
+        self._last_subscriptions_gallery_query_timestamps = collections.defaultdict( int )
+        self._last_watchers_query_timestamps = collections.defaultdict( int )
         
         self._tracker_container_names_to_tracker_containers = {}
         self._network_contexts_to_tracker_containers = {}
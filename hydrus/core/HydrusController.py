@@ -57,7 +57,7 @@ class HydrusController( object ):
         
         self._timestamps_lock = threading.Lock()
         
-        self._timestamps = collections.defaultdict( lambda: 0 )
+        self._timestamps = collections.defaultdict( int )
         
         self._timestamps[ 'boot' ] = HydrusData.GetNow()
         
@@ -910,13 +910,15 @@ def GetTypeName( obj_type ):
         return repr( obj_type )
         
     
+HUMAN_TEXT_SORT_NUMBER_GROUP_PATTERN = re.compile( '([0-9]+)' )
+
 def GenerateHumanTextSortKey():
     """Solves the 19, 20, 200, 21, 22 issue when sorting 'Page 21.jpg' type strings.
     Breaks the string into groups of text and int (i.e. ( "Page ", 21, ".jpg" ) )."""
     
     int_convert = lambda t: int( t ) if t.isdecimal() else t
     
-    split_alphanum = lambda t: tuple( ( int_convert( sub_t ) for sub_t in re.split( '([0-9]+)', t.lower() ) ) )
+    split_alphanum = lambda t: tuple( ( int_convert( sub_t ) for sub_t in HUMAN_TEXT_SORT_NUMBER_GROUP_PATTERN.split( t.lower() ) ) )
     
     return split_alphanum
     
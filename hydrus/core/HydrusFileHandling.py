@@ -143,6 +143,15 @@ def GetExtraHashesFromPath( path ):
     
     with open( path, 'rb' ) as f:
         
+        if hasattr( os, 'posix_fadvise' ):
+            
+            # same single sequential read as GetHashFromPath, so give the kernel the same heads-up
+            
+            os.posix_fadvise( f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL | os.POSIX_FADV_WILLNEED )
+            
+        
+        # every hasher gets each block as it comes in, so the file is read exactly once--and a read error stays a catchable OSError rather than an mmap SIGBUS
+        
         for block in HydrusPaths.ReadFileLikeAsBlocks( f ):
             
             h_md5.update( block )
@@ -157,6 +166,40 @@ def GetExtraHashesFromPath( path ):
     
     return ( md5, sha1, sha512 )
     
+def GetAllHashesFromPath( path, avoid_cache_pollution = False ):
+    
+    # integrity checks want the sha256 and the other-hashes job wants the rest--one read serves both
+    
+    h_sha256 = hashlib.sha256()
+    h_md5 = hashlib.md5()
+    h_sha1 = hashlib.sha1()
+    h_sha512 = hashlib.sha512()
+    
+    with open( path, 'rb' ) as f:
+        
+        if hasattr( os, 'posix_fadvise' ):
+            
+            os.posix_fadvise( f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL | os.POSIX_FADV_WILLNEED )
+            
+        
+        # every hasher gets each block as it comes in, so the file is read exactly once--and a read error stays a catchable OSError rather than an mmap SIGBUS
+        
+        for block in HydrusPaths.ReadFileLikeAsBlocks( f ):
+            
+            h_sha256.update( block )
+            h_md5.update( block )
+            h_sha1.update( block )
+            h_sha512.update( block )
+            
+        
+        if avoid_cache_pollution and hasattr( os, 'posix_fadvise' ):
+            
+            os.posix_fadvise( f.fileno(), 0, 0, os.POSIX_FADV_DONTNEED )
+            
+        
+    
+    return ( h_sha256.digest(), h_md5.digest(), h_sha1.digest(), h_sha512.digest() )
+    
 def GetFileInfo( path, mime = None, ok_to_look_for_hydrus_updates = False ):
     
     size = os.path.getsize( path )
@@ -266,17 +309,33 @@ def GetFileModifiedTimestamp( path ):
     
     return file_modified_timestamp
     
-def GetHashFromPath( path ):
+def GetHashFromPath( path, avoid_cache_pollution = False ):
     
     h = hashlib.sha256()
     
     with open( path, 'rb' ) as f:
         
+        if hasattr( os, 'posix_fadvise' ):
+            
+            # we are going to read the whole file exactly once, so let the kernel ramp readahead right up and start pulling pages in before we ask for them
+            
+            os.posix_fadvise( f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL | os.POSIX_FADV_WILLNEED )
+            
+        
+        # a plain block read rather than an mmap: a read error mid-file on a dying drive stays a catchable OSError, where a faulting mapped page would kill the whole process with SIGBUS
+        
         for block in HydrusPaths.ReadFileLikeAsBlocks( f ):
             
             h.update( block )
             
         
+        if avoid_cache_pollution and hasattr( os, 'posix_fadvise' ):
+            
+            # drop the pages we just pulled in--a terabyte integrity sweep should not evict what the user is actually looking at
+            
+            os.posix_fadvise( f.fileno(), 0, 0, os.POSIX_FADV_DONTNEED )
+            
+        
     
     return h.digest()
     
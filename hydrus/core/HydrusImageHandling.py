@@ -384,7 +384,7 @@ def GenerateThumbnailBytesFromStaticImagePath( path, target_resolution, mime ):
     
     thumbnail_pil_image = pil_image.resize( target_resolution, PILImage.ANTIALIAS )
     
-    thumbnail_bytes = GenerateThumbnailBytesPIL( pil_image, mime )
+    thumbnail_bytes = GenerateThumbnailBytesPIL( thumbnail_pil_image, mime )
     
     return thumbnail_bytes
     
@@ -506,7 +506,9 @@ def GetImagePixelHash( path, mime ):
     
     numpy_image = GenerateNumPyImage( path, mime )
     
-    return hashlib.sha256( numpy_image.data.tobytes() ).digest()
+    # hashing the array's buffer in place spares a tobytes memcpy of the whole decoded image
+    
+    return hashlib.sha256( numpy.ascontiguousarray( numpy_image ).data ).digest()
     
 def GetImageProperties( path, mime ):
     
@@ -540,6 +542,16 @@ def GetImageProperties( path, mime ):
     
 # bigger number is worse quality
 # this is very rough and misses some finesse
+def GetImageResolution( path ):
+    
+    # PIL serves this straight from the header, so it is massively cheaper than a full decode
+    
+    pil_image = GeneratePILImage( path )
+    
+    ( x, y ) = pil_image.size
+    
+    return ( x, y )
+    
 def GetJPEGQuantizationQualityEstimate( path ):
     
     pil_image = GeneratePILImage( path )
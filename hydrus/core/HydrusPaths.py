@@ -16,6 +16,14 @@ from hydrus.core import HydrusData
 from hydrus.core import HydrusGlobals as HG
 from hydrus.core import HydrusThreading
 
+if HC.PLATFORM_LINUX:
+    
+    import fcntl
+    
+    # linux/include/uapi/linux/fs.h, _IOW( 0x94, 9, int )
+    FICLONE = 0x40049409
+    
+
 TEMP_PATH_LOCK = threading.Lock()
 IN_USE_TEMP_PATHS = set()
 
@@ -753,6 +761,43 @@ def MergeTree( source, dest, text_update_hook = None ):
             
         
     
+def TryToCloneFile( source, dest ):
+    
+    # on a copy-on-write filesystem (btrfs, xfs, etc...), a reflink clone is O(1) and shares the data blocks, so let's try it before paying for a full byte copy
+    
+    if not HC.PLATFORM_LINUX:
+        
+        return False
+        
+    
+    try:
+        
+        with open( source, 'rb' ) as source_f:
+            
+            with open( dest, 'wb' ) as dest_f:
+                
+                fcntl.ioctl( dest_f.fileno(), FICLONE, source_f.fileno() )
+                
+            
+        
+        return True
+        
+    except OSError:
+        
+        # different device, non-CoW filesystem, or some other objection--clean up our empty file and let the caller do a normal copy
+        
+        try:
+            
+            os.unlink( dest )
+            
+        except OSError:
+            
+            pass
+            
+        
+        return False
+        
+    
 def MirrorFile( source, dest ):
     
     if not PathsHaveSameSizeAndDate( source, dest ):
@@ -774,7 +819,14 @@ def MirrorFile( source, dest ):
                     
                 
             
-            if copy_metadata:
+            if TryToCloneFile( source, dest ):
+                
+                if copy_metadata:
+                    
+                    shutil.copystat( source, dest )
+                    
+                
+            elif copy_metadata:
                 
                 # this overwrites on conflict without hassle
                 shutil.copy2( source, dest )